@@ -1,6 +1,6 @@
 from pylord.app import PyLordApp
 from pylord.middleware import Middleware
-from pylord.orm import ForeignKey, Table, Column, Database
+from pylord.orm import ForeignKey, Table, Column, Database, atomic
 import threading
 from helper_file import generate_token
 
@@ -9,7 +9,8 @@ threading_local = threading.local()
 
 def get_db():
     if not hasattr(threading_local, "db"):
-        threading_local.db = Database("./test_main.db")
+        # writers check for existing rows before inserting, take the write lock up front
+        threading_local.db = Database("./test_main.db", isolation="IMMEDIATE")
     return threading_local.db
 
 
@@ -111,6 +112,7 @@ def check_password(password, hashed_password):
 
 
 @app.route("/user_register", allowed_methods=['post'])
+@atomic(get_db)
 def user_register(req, resp):
     db = get_db()
 
@@ -181,6 +183,7 @@ def login(req, resp):
 
 
 @app.route("/create_product", allowed_methods=['post'])
+@atomic(get_db)
 def create_product(req, resp):
     db = get_db()
     db.create(Product)
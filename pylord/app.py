@@ -1,57 +1,142 @@
-from webob import Request
+from .request import Request
 from .response import Response
-from parse import parse
-import inspect
+import functools
+import time
 import requests
 import wsgiadapter
-from jinja2 import Environment, FileSystemLoader
-import os
 from whitenoise import WhiteNoise
-from .middleware import Middleware
+from .middleware import MiddlewarePipeline
+from .serializers import get_serializer
+from .cache import make_cache
+from .compression import CompressionMiddleware
+from .conditional import (
+    quote_etag, etag_matches, not_modified, is_conditional, add_weak_etag, evaluate_preconditions
+)
+from .templating import create_template_env, warm_templates
+from .static import StaticURL, load_manifest
+from .metrics import (
+    Metrics, DEFAULT_BUCKETS, UNMATCHED_ROUTE, PROMETHEUS_CONTENT_TYPE, instrument_router, start_timings,
+    stop_timings, record_timing, server_timing_header
+)
+from .profiling import Profiler, profiled, profile_report
+from .limits import ConcurrencyLimiter, make_limiter, overloaded, limited, collect_limits
+from .router import Router, HTTP_METHODS, build_dispatch, allow_header
 
 
 class PyLordApp:
-    def __init__(self, templates_dir="templates", static_dir="static"):
+    def __init__(self, templates_dir="templates", static_dir="static", serializer=None, auto_etag=False,
+                 production=False, template_cache_size=400, template_bytecode_dir=None, static_root=None):
         self.routes = dict()
+        self.serializer = serializer or get_serializer()
+        self.auto_etag = auto_etag
+        self.router = Router()
 
-        self.template_env = Environment(
-            loader=FileSystemLoader(os.path.abspath(templates_dir))
+        self.production = production
+        self.template_env = create_template_env(
+            templates_dir, production, template_cache_size, template_bytecode_dir
         )
         self.exception_handler = None
 
-        self.whitenoise = WhiteNoise(self.wsgi_app, root=static_dir, prefix="/static")
+        if production:
+            # collected files are served from an index built once; WhiteNoise also picks up
+            # the .br/.gz siblings written by collect_static
+            static_root = static_root or static_dir
+            self.static_url = StaticURL(manifest=load_manifest(static_root))
+            self.whitenoise = WhiteNoise(
+                self.wsgi_app, root=static_root, prefix="/static", autorefresh=False,
+                immutable_file_test=lambda path, url: self.static_url.is_immutable(url)
+            )
+        else:
+            self.static_url = StaticURL()
+            self.whitenoise = WhiteNoise(self.wsgi_app, root=static_dir, prefix="/static")
+
+        self.template_env.globals["static_url"] = self.static_url
 
-        self.middleware = Middleware(self)
+        self.middleware = MiddlewarePipeline(self)
+        self.metrics = None
+        self.limiter = None
 
     def __call__(self, environ, start_response):
         path_info = environ["PATH_INFO"]
+        environ["pylord.serializer"] = self.serializer
         if path_info.startswith("/static"):
             return self.whitenoise(environ, start_response)
 
+        if self.metrics is not None:
+            return self.instrumented_call(environ, start_response)
+
         return self.middleware(environ, start_response)
 
+    def instrumented_call(self, environ, start_response):
+        if environ["PATH_INFO"] == self.metrics.path:
+            response = Response()
+            response.body = self.metrics.render().encode()
+            response.content_type = PROMETHEUS_CONTENT_TYPE
+            return response(environ, start_response)
+
+        timings, token = start_timings()
+        started = time.perf_counter()
+        try:
+            response = self.middleware.handle_request(Request(environ))
+            handled = time.perf_counter()
+            body = response.render() if response.stream is None else b""
+        except Exception:
+            self.metrics.observe(
+                environ.get("pylord.route", UNMATCHED_ROUTE), 500, time.perf_counter() - started, 0
+            )
+            raise
+        finally:
+            stop_timings(token)
+
+        finished = time.perf_counter()
+        record_timing(timings, "handler", handled - started - timings.get("routing", 0.0))
+        record_timing(timings, "serialization", finished - handled)
+
+        if self.metrics.server_timing:
+            response.headers["Server-Timing"] = server_timing_header(timings)
+
+        self.metrics.observe(
+            environ.get("pylord.route", UNMATCHED_ROUTE), response.status_code, finished - started, len(body)
+        )
+
+        return response(environ, start_response)
+
     def wsgi_app(self, environ, start_response):
         request = Request(environ)
         response = self.handle_request(request)
         return response(environ, start_response)
 
     def handle_request(self, request):
-        response = Response()
+        response = Response(self.serializer)
 
         handler_data, kwargs = self.find_handler(request)
         if handler_data is not None:
-            handler = handler_data["handler"]
-            allowed_methods = handler_data["allowed_methods"]
+            handler = handler_data["dispatch"].get(request.method.lower())
 
-            if inspect.isclass(handler):
-                handler = getattr(handler(), request.method.lower(), None)
+            if handler is None:
+                return self.method_not_allowed_response(response, handler_data["allow"])
 
-                if handler is None:
-                    return self.method_not_allowed_response(response)
+            etag = None
+            if handler_data["etag"] is not None and request.method in ("GET", "HEAD"):
+                etag = handler_data["etag"](request, **kwargs)
+                if etag is not None:
+                    etag = quote_etag(etag)
+                    if etag_matches(request.headers.get("If-None-Match", ""), etag):
+                        response.headers["ETag"] = etag
+                        return not_modified(response)
 
-            else:
-                if request.method.lower() not in allowed_methods:
-                    return self.method_not_allowed_response(response)
+            cache = handler_data["cache"]
+            cache_key = None
+            if cache is not None and request.method in ("GET", "HEAD"):
+                cache_key = cache.make_key(request.method, request.path, request.query_string, request.headers)
+                entry = cache.get(cache_key)
+                if entry is not None:
+                    cache.restore(entry, response)
+                    return evaluate_preconditions(request, response)
+
+            limiter = handler_data["limiter"]
+            if limiter is not None and not limiter.acquire():
+                return overloaded(response, limiter)
 
             try:
                 handler(request, response, **kwargs)
@@ -60,44 +145,69 @@ class PyLordApp:
                     self.exception_handler(request, response, e)
                 else:
                     raise e
+            else:
+                if etag is not None and is_conditional(request, response):
+                    response.headers.setdefault("ETag", etag)
+                if self.auto_etag:
+                    add_weak_etag(request, response)
+                if cache_key is not None:
+                    cache.store(cache_key, response)
+
+                return evaluate_preconditions(request, response)
+            finally:
+                if limiter is not None:
+                    limiter.release()
         else:
             self.default_response(response)
 
         return response
 
-    def method_not_allowed_response(self, response):
+    def method_not_allowed_response(self, response, allow=None):
         response.status_code = 405
+        if allow is not None:
+            response.headers["Allow"] = allow
         response.text = "Method not allowed"
         return response
 
     def find_handler(self, request):
-        for path, handler_data in self.routes.items():
-            parsed_result = parse(path, request.path)
-            if parsed_result is not None:
-                return handler_data, parsed_result.named
-
-        return None, None
+        return self.router.match(request.path)
 
     def default_response(self, response):
         response.status_code = 404
         response.text = 'Not Found'
 
-    def add_route(self, path, handler, allowed_methods=None):
+    def add_route(self, path, handler, allowed_methods=None, singleton=False, cache=None, etag=None, limit=None):
         assert path not in self.routes, "Duplicate Rout. Please Change The URL"
 
         if allowed_methods is None:
-            allowed_methods = ["post", "put", "patch", "options", "delete", "get", "head", "connect", "trace"]
+            allowed_methods = HTTP_METHODS
 
-        self.routes[path] = {"handler": handler, "allowed_methods": allowed_methods}
+        dispatch = build_dispatch(handler, allowed_methods, singleton)
+        self.routes[path] = {
+            "path": path,
+            "handler": handler,
+            "allowed_methods": allowed_methods,
+            "dispatch": dispatch,
+            "allow": allow_header(dispatch),
+            "cache": make_cache(cache),
+            "etag": etag,
+            "limiter": make_limiter(limit),
+        }
+        self.router.add(path, self.routes[path])
         return handler
 
-    def route(self, path, allowed_methods=None):
+    def route(self, path, allowed_methods=None, singleton=False, cache=None, etag=None, limit=None):
         def wrapper(handler):
-            self.add_route(path, handler, allowed_methods)
+            self.add_route(path, handler, allowed_methods, singleton, cache, etag, limit)
             return handler
 
         return wrapper
 
+    def invalidate_cache(self, path=None):
+        for handler_data in self.routes.values():
+            if handler_data["cache"] is not None:
+                handler_data["cache"].invalidate(path)
+
     def test_session(self):
         session = requests.Session()
         session.mount('http://testserver/', wsgiadapter.WSGIAdapter(self))
@@ -109,8 +219,47 @@ class PyLordApp:
 
         return self.template_env.get_template(template_name).render(**context)
 
+    def warm_templates(self):
+        return warm_templates(self.template_env)
+
+    def enable_metrics(self, path="/metrics", server_timing=False, buckets=DEFAULT_BUCKETS):
+        self.metrics = Metrics(path, buckets, server_timing)
+        self.metrics.add_collector(lambda: collect_limits(self.limiters()))
+        instrument_router(self, lambda request: request.environ)
+        return self.metrics
+
+    def limit_concurrency(self, max_in_flight, max_queue=0, queue_timeout=None, retry_after=1):
+        self.limiter = ConcurrencyLimiter(max_in_flight, max_queue, queue_timeout, retry_after)
+        self.handle_request = limited(self.limiter, self.handle_request, Response, self.serializer)
+        return self.limiter
+
+    def limiters(self):
+        if self.limiter is not None:
+            yield "global", self.limiter
+        for path, handler_data in self.routes.items():
+            if handler_data["limiter"] is not None:
+                yield path, handler_data["limiter"]
+
+    def enable_profiling(self, sample_rate=0.0, header="X-Profile", path=None):
+        self.profiler = Profiler(sample_rate, header)
+        instrument_router(self, lambda request: request.environ)
+        self.handle_request = profiled(self.profiler, self.handle_request, lambda request: request.environ)
+
+        if path is not None:
+            def profile_admin(req, resp):
+                body = profile_report(self.profiler, resp, req.GET.get("route"), req.GET.get("format"))
+                if body is not None:
+                    resp.body = body
+
+            self.add_route(path, profile_admin, ["get"])
+
+        return self.profiler
+
     def add_exception_handler(self, handler):
         self.exception_handler = handler
 
     def add_middleware(self, middleware_cls):
         self.middleware.add(middleware_cls)
+
+    def add_compression(self, **options):
+        self.add_middleware(functools.partial(CompressionMiddleware, **options))
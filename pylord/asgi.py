@@ -1,65 +1,265 @@
-from starlette.requests import Request as ASGIRequest
+from .asgi_request import Request as ASGIRequest, RequestError
 import inspect
-from parse import parse
-from jinja2 import Environment, FileSystemLoader
-import os
+import time
+import traceback
+from starlette.datastructures import State
+from starlette.websockets import WebSocket
 from .asgi_response import Response
-from starlette.staticfiles import StaticFiles
+from .serializers import get_serializer
+from .compression import Compressor
+from .cache import make_cache
+from .conditional import (
+    quote_etag, etag_matches, not_modified, is_conditional, add_weak_etag, evaluate_preconditions
+)
+from .templating import create_template_env, warm_templates
+from .static import StaticURL, load_manifest
+from .asgi_static import StaticFiles
+from .asgi_middleware import MiddlewarePipeline
+from .metrics import (
+    Metrics, DEFAULT_BUCKETS, UNMATCHED_ROUTE, PROMETHEUS_CONTENT_TYPE, instrument_router, start_timings,
+    stop_timings, record_timing, server_timing_header
+)
+from .profiling import Profiler, profiled_async, profile_report
+from .broadcast import Broadcast
+from .limits import AsyncConcurrencyLimiter, make_limiter, overloaded, limited_async, collect_limits
+from .threadpool import ThreadPool, is_async_callable, sync_methods
+from .router import Router, HTTP_METHODS, build_dispatch, allow_header
 
 
 class PyLordASGI:
 
-    def __init__(self, templates_dir='templates', static_dir="static"):
+    def __init__(self, templates_dir='templates', static_dir="static", serializer=None, auto_etag=False,
+                 production=False, template_cache_size=400, template_bytecode_dir=None, static_root=None,
+                 max_threads=40, max_body_size=None):
         self.routes = {}
+        self.serializer = serializer or get_serializer()
+        self.auto_etag = auto_etag
+        self.router = Router()
         self.exception_handler = None
+        self.exception_handler_is_async = False
+        self.compressor = None
+        self.thread_pool = ThreadPool(max_threads)
+        self.max_body_size = max_body_size
+        self.state = State()
+        self.broadcast = Broadcast(self.serializer)
+        self.startup_hooks = []
+        self.shutdown_hooks = []
 
+        self.production = production
         if templates_dir:
-            self.template_env = Environment(
-                loader=FileSystemLoader(os.path.abspath(templates_dir))
+            self.template_env = create_template_env(
+                templates_dir, production, template_cache_size, template_bytecode_dir
+            )
+            self.async_template_env = create_template_env(
+                templates_dir, production, template_cache_size, template_bytecode_dir, enable_async=True
             )
         else:
             self.template_env = None
+            self.async_template_env = None
+
+        self.middleware = MiddlewarePipeline(self)
+        self.metrics = None
+        self.limiter = None
 
         self.static_dir = static_dir
 
-        if static_dir:
-            self.static_app = StaticFiles(directory=static_dir)
+        if production and (static_root or static_dir):
+            static_root = static_root or static_dir
+            self.static_url = StaticURL(manifest=load_manifest(static_root))
+            self.static_app = StaticFiles(static_root, static_url=self.static_url, indexed=True)
+        elif static_dir:
+            self.static_url = StaticURL()
+            self.static_app = StaticFiles(static_dir)
         else:
+            self.static_url = StaticURL()
             self.static_app = None
 
+        if self.template_env:
+            self.template_env.globals["static_url"] = self.static_url
+            self.async_template_env.globals["static_url"] = self.static_url
+
     async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            return await self.lifespan(receive, send)
+
+        scope["app"] = self
+
+        if scope["type"] == "websocket":
+            return await self.handle_websocket(scope, receive, send)
+
         if self.static_app and scope['path'].startswith('/static'):
             return await self.static_app(scope, receive, send)
 
+        scope["pylord.serializer"] = self.serializer
+        scope["pylord.max_body_size"] = self.max_body_size
+
+        if self.metrics is not None:
+            return await self.instrumented_call(scope, receive, send)
+
         request = ASGIRequest(scope, receive)
-        response = await self.handle_asgi_request(request)
+        response = await self.middleware.handle_request(request)
+
+        if self.compressor is not None:
+            self.compressor.compress_response(response, request.headers.get("accept-encoding"), body_attr="content")
+
         await response(scope, receive, send)
+        await request.close()
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+
+            if message["type"] == "lifespan.startup":
+                try:
+                    await self.run_hooks(self.startup_hooks)
+                except Exception:
+                    await send({"type": "lifespan.startup.failed", "message": traceback.format_exc()})
+                    return
+                await send({"type": "lifespan.startup.complete"})
+
+            elif message["type"] == "lifespan.shutdown":
+                try:
+                    await self.run_hooks(self.shutdown_hooks)
+                except Exception:
+                    await send({"type": "lifespan.shutdown.failed", "message": traceback.format_exc()})
+                    return
+                finally:
+                    self.thread_pool.shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    @staticmethod
+    async def run_hooks(hooks):
+        for hook in hooks:
+            result = hook()
+            if inspect.isawaitable(result):
+                await result
+
+    def on_startup(self, hook):
+        self.startup_hooks.append(hook)
+        return hook
+
+    def on_shutdown(self, hook):
+        self.shutdown_hooks.append(hook)
+        return hook
+
+    async def handle_websocket(self, scope, receive, send):
+        websocket = WebSocket(scope, receive, send)
+
+        handler_data, kwargs = self.find_handler(websocket)
+        if handler_data is None or handler_data["websocket"] is None:
+            await websocket.close()
+            return
+
+        await handler_data["websocket"](websocket, **kwargs)
+
+    async def instrumented_call(self, scope, receive, send):
+        if scope["path"] == self.metrics.path:
+            response = Response()
+            response.content = self.metrics.render().encode()
+            response.content_type = PROMETHEUS_CONTENT_TYPE
+            return await response(scope, receive, send)
+
+        timings, token = start_timings()
+        started = time.perf_counter()
+        try:
+            request = ASGIRequest(scope, receive)
+            response = await self.middleware.handle_request(request)
+            handled = time.perf_counter()
+
+            if self.compressor is not None:
+                self.compressor.compress_response(
+                    response, request.headers.get("accept-encoding"), body_attr="content"
+                )
+            body = response.render() if response.stream is None else b""
+        except Exception:
+            self.metrics.observe(scope.get("pylord.route", UNMATCHED_ROUTE), 500, time.perf_counter() - started, 0)
+            raise
+        finally:
+            stop_timings(token)
+
+        rendered = time.perf_counter()
+        record_timing(timings, "handler", handled - started - timings.get("routing", 0.0))
+        record_timing(timings, "serialization", rendered - handled)
+
+        if self.metrics.server_timing:
+            response.headers["Server-Timing"] = server_timing_header(timings)
+
+        await response(scope, receive, send)
+        await request.close()
+
+        self.metrics.observe(
+            scope.get("pylord.route", UNMATCHED_ROUTE), response.status_code, time.perf_counter() - started, len(body)
+        )
 
     async def handle_asgi_request(self, request):
-        response = Response()
+        response = Response(self.serializer)
 
         handler_data, kwargs = self.find_handler(request)
         if handler_data is not None:
-            handler = handler_data["handler"]
-            allowed_methods = handler_data["methods"]
+            handler = handler_data["dispatch"].get(request.method.lower())
+            if handler is None:
+                return self.method_not_allowed_response(response, handler_data["allow"])
 
-            if inspect.isclass(handler):
-                handler = getattr(handler(), request.method.lower(), None)
-                if handler is None:
-                    return self.method_not_allowed_response(response)
-            else:
-                if request.method.lower() not in allowed_methods:
-                    return self.method_not_allowed_response(response)
+            etag = None
+            if handler_data["etag"] is not None and request.method in ("GET", "HEAD"):
+                if handler_data["etag_threaded"]:
+                    etag = await self.thread_pool.run(handler_data["etag"], request, **kwargs)
+                else:
+                    etag = handler_data["etag"](request, **kwargs)
+                    if inspect.isawaitable(etag):
+                        etag = await etag
+                if etag is not None:
+                    etag = quote_etag(etag)
+                    if etag_matches(request.headers.get("If-None-Match", ""), etag):
+                        response.headers["ETag"] = etag
+                        return not_modified(response, "content")
+
+            cache = handler_data["cache"]
+            cache_key = None
+            if cache is not None and request.method in ("GET", "HEAD"):
+                cache_key = cache.make_key(
+                    request.method, request.scope["path"], request.scope["query_string"], request.headers
+                )
+                entry = cache.get(cache_key)
+                if entry is not None:
+                    cache.restore(entry, response, body_attr="content")
+                    return evaluate_preconditions(request, response, "content")
+
+            limiter = handler_data["limiter"]
+            if limiter is not None and not await limiter.acquire():
+                return overloaded(response, limiter)
 
             try:
-                result = handler(request, response, **kwargs)
+                if request.method.lower() in handler_data["threaded"]:
+                    result = await self.thread_pool.run(handler, request, response, **kwargs)
+                else:
+                    result = handler(request, response, **kwargs)
                 if inspect.isawaitable(result):
                     result = await result
+            except RequestError as e:
+                return self.request_error_response(response, e)
             except Exception as e:
-                if self.exception_handler is not None:
+                if self.exception_handler is None:
+                    raise e
+                if self.exception_handler_is_async:
                     await self.exception_handler(request, response, e)
                 else:
-                    raise e
+                    result = await self.thread_pool.run(self.exception_handler, request, response, e)
+                    if inspect.isawaitable(result):
+                        await result
+            else:
+                if etag is not None and is_conditional(request, response):
+                    response.headers.setdefault("ETag", etag)
+                if self.auto_etag:
+                    add_weak_etag(request, response)
+                if cache_key is not None:
+                    cache.store(cache_key, response)
+
+                return evaluate_preconditions(request, response, "content")
+            finally:
+                if limiter is not None:
+                    limiter.release()
         else:
             self.default_response(response)
 
@@ -69,33 +269,81 @@ class PyLordASGI:
         response.status_code = 404
         response.text = 'Not Found'
 
-    def method_not_allowed_response(self, response):
+    def request_error_response(self, response, error):
+        response.status_code = error.status_code
+        response.text = str(error)
+        return response
+
+    def method_not_allowed_response(self, response, allow=None):
         response.status_code = 405
+        if allow is not None:
+            response.headers["Allow"] = allow
         response.text = "Method not allowed"
         return response
 
-    def add_route(self, path, handler, methods=None):
+    def add_route(self, path, handler, methods=None, singleton=False, cache=None, etag=None, inline=False, limit=None):
         assert path not in self.routes, "Duplicate Route. Please Change The URL"
 
         if methods is None:
-            methods = ["post", "put", "patch", "options", "delete", "get", "head", "connect", "trace"]
+            methods = HTTP_METHODS
 
-        self.routes[path] = {"handler": handler, "methods": methods}
+        dispatch = build_dispatch(handler, methods, singleton)
+        self.routes[path] = {
+            "path": path,
+            "handler": handler,
+            "methods": methods,
+            "dispatch": dispatch,
+            "allow": allow_header(dispatch),
+            "cache": make_cache(cache),
+            "etag": etag,
+            # sync handlers and etag hooks run on the thread pool unless the route is marked inline
+            "threaded": frozenset() if inline else sync_methods(handler, dispatch),
+            "etag_threaded": etag is not None and not inline and not is_async_callable(etag),
+            "limiter": make_limiter(limit, AsyncConcurrencyLimiter),
+            "websocket": None,
+        }
+        self.router.add(path, self.routes[path])
         return handler
 
-    def route(self, path, methods=None):
+    def add_websocket_route(self, path, handler):
+        assert path not in self.routes, "Duplicate Route. Please Change The URL"
+        assert is_async_callable(handler), "WebSocket handlers must be async"
+
+        # HTTP requests to a websocket-only path get a 405 without allowed methods
+        self.routes[path] = {
+            "path": path,
+            "handler": handler,
+            "methods": [],
+            "dispatch": {},
+            "allow": "",
+            "cache": None,
+            "etag": None,
+            "threaded": frozenset(),
+            "etag_threaded": False,
+            "limiter": None,
+            "websocket": handler,
+        }
+        self.router.add(path, self.routes[path])
+        return handler
+
+    def websocket_route(self, path):
+        def wrapper(handler):
+            return self.add_websocket_route(path, handler)
+        return wrapper
+
+    def route(self, path, methods=None, singleton=False, cache=None, etag=None, inline=False, limit=None):
         def wrapper(handler):
-            self.add_route(path, handler, methods)
+            self.add_route(path, handler, methods, singleton, cache, etag, inline, limit)
             return handler
         return wrapper
 
-    def find_handler(self, request):
-        for path, handler_data in self.routes.items():
-            parsed_result = parse(path, request.scope["path"])
-            if parsed_result is not None:
-                return handler_data, parsed_result.named
+    def invalidate_cache(self, path=None):
+        for handler_data in self.routes.values():
+            if handler_data["cache"] is not None:
+                handler_data["cache"].invalidate(path)
 
-        return None, None
+    def find_handler(self, request):
+        return self.router.match(request.scope["path"])
 
     def template(self, template_name, context=None):
         if not self.template_env:
@@ -105,8 +353,85 @@ class PyLordASGI:
 
         return self.template_env.get_template(template_name).render(**context)
 
+    async def template_async(self, template_name, context=None):
+        if not self.async_template_env:
+            raise RuntimeError("Templates Not Configured.")
+        if context is None:
+            context = {}
+
+        return await self.async_template_env.get_template(template_name).render_async(**context)
+
+    async def template_stream(self, template_name, context=None, chunk_size=8192):
+        if not self.async_template_env:
+            raise RuntimeError("Templates Not Configured.")
+        if context is None:
+            context = {}
+
+        # jinja yields every output fragment separately, group them so each send carries a useful amount
+        buffer = []
+        buffered = 0
+        async for fragment in self.async_template_env.get_template(template_name).generate_async(**context):
+            buffer.append(fragment)
+            buffered += len(fragment)
+            if buffered >= chunk_size:
+                yield "".join(buffer).encode()
+                buffer = []
+                buffered = 0
+
+        if buffer:
+            yield "".join(buffer).encode()
+
+    def warm_templates(self):
+        if not self.template_env:
+            raise RuntimeError("Templates Not Configured.")
+
+        warm_templates(self.async_template_env)
+        return warm_templates(self.template_env)
+
     def add_exception_handler(self, handler):
         self.exception_handler = handler
+        self.exception_handler_is_async = is_async_callable(handler)
+
+    def enable_metrics(self, path="/metrics", server_timing=False, buckets=DEFAULT_BUCKETS):
+        self.metrics = Metrics(path, buckets, server_timing)
+        self.metrics.add_collector(lambda: collect_limits(self.limiters()))
+        self.metrics.add_collector(self.thread_pool.collect)
+        instrument_router(self, lambda request: request.scope)
+        return self.metrics
+
+    def limit_concurrency(self, max_in_flight, max_queue=0, queue_timeout=None, retry_after=1):
+        self.limiter = AsyncConcurrencyLimiter(max_in_flight, max_queue, queue_timeout, retry_after)
+        self.handle_asgi_request = limited_async(self.limiter, self.handle_asgi_request, Response, self.serializer)
+        return self.limiter
+
+    def limiters(self):
+        if self.limiter is not None:
+            yield "global", self.limiter
+        for path, handler_data in self.routes.items():
+            if handler_data["limiter"] is not None:
+                yield path, handler_data["limiter"]
+
+    def enable_profiling(self, sample_rate=0.0, header="X-Profile", path=None):
+        self.profiler = Profiler(sample_rate, header)
+        self.thread_pool.profiler = self.profiler
+        instrument_router(self, lambda request: request.scope)
+        self.handle_asgi_request = profiled_async(
+            self.profiler, self.handle_asgi_request, lambda request: request.scope
+        )
+
+        if path is not None:
+            def profile_admin(req, resp):
+                params = req.query_params
+                body = profile_report(self.profiler, resp, params.get("route"), params.get("format"))
+                if body is not None:
+                    resp.content = body
+
+            self.add_route(path, profile_admin, ["get"], inline=True)
 
+        return self.profiler
 
+    def add_middleware(self, middleware_cls):
+        self.middleware.add(middleware_cls)
 
+    def add_compression(self, **options):
+        self.compressor = Compressor(**options)
@@ -0,0 +1,52 @@
+import inspect
+from .middleware import Pipeline
+
+
+class Middleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def process_request(self, req):
+        pass
+
+    async def process_response(self, req, resp):
+        pass
+
+    async def handle_request(self, request):
+        response = await self.process_request(request)
+        if response is None:
+            response = await self.app.handle_asgi_request(request)
+        await self.process_response(request, response)
+
+        return response
+
+    async def handle_asgi_request(self, request):
+        # lets an outer middleware wrap this one the way it would wrap the app
+        return await self.handle_request(request)
+
+
+class MiddlewarePipeline(Pipeline):
+    middleware_base = Middleware
+
+    async def handle_request(self, request):
+        if self.nested is not None:
+            return await self.nested.handle_request(request)
+
+        reached = len(self.stack)
+        for depth, hook in self.request_hooks:
+            response = hook(request)
+            if inspect.isawaitable(response):
+                response = await response
+            if response is not None:
+                reached = depth
+                break
+        else:
+            response = await self.app.handle_asgi_request(request)
+
+        for depth, hook in self.response_hooks:
+            if depth <= reached:
+                result = hook(request, response)
+                if inspect.isawaitable(result):
+                    await result
+
+        return response
@@ -0,0 +1,71 @@
+from starlette.requests import Request as StarletteRequest
+from .serializers import default_serializer
+from .multipart import DEFAULT_SPOOL_SIZE, MultipartError, get_boundary, parse_multipart
+
+
+class RequestError(Exception):
+    status_code = 400
+
+
+class PayloadTooLarge(RequestError):
+    status_code = 413
+
+
+class Request(StarletteRequest):
+
+    def max_body_size(self, max_size=None):
+        return self.scope.get("pylord.max_body_size") if max_size is None else max_size
+
+    async def stream_body(self, max_size=None):
+        """
+        Yields the request body chunk by chunk as it arrives, raising
+        ``PayloadTooLarge`` as soon as it grows past ``max_size`` (the app's
+        ``max_body_size`` by default).
+        """
+        if hasattr(self, "_body"):
+            yield self._body
+            return
+
+        max_size = self.max_body_size(max_size)
+        if max_size is not None:
+            content_length = self.headers.get("content-length")
+            if content_length is not None and content_length.isdigit() and int(content_length) > max_size:
+                raise PayloadTooLarge(f"Request body exceeds {max_size} bytes")
+
+        received = 0
+        async for chunk in self.stream():
+            if not chunk:
+                continue
+
+            received += len(chunk)
+            if max_size is not None and received > max_size:
+                raise PayloadTooLarge(f"Request body exceeds {max_size} bytes")
+            yield chunk
+
+    async def body(self):
+        if not hasattr(self, "_body"):
+            self._body = b"".join([chunk async for chunk in self.stream_body()])
+        return self._body
+
+    async def json(self):
+        if not hasattr(self, "_json"):
+            serializer = self.scope.get("pylord.serializer", default_serializer)
+            self._json = serializer.loads(await self.body())
+        return self._json
+
+    async def multipart(self, max_size=None, spool_size=DEFAULT_SPOOL_SIZE, max_fields=1000, max_files=1000,
+                        max_field_size=1024 * 1024):
+        if not hasattr(self, "_multipart"):
+            try:
+                boundary = get_boundary(self.headers.get("content-type"))
+                self._multipart = await parse_multipart(
+                    self.stream_body(max_size), boundary, spool_size, max_fields, max_files, max_field_size
+                )
+            except MultipartError as e:
+                raise RequestError(str(e)) from e
+        return self._multipart
+
+    async def close(self):
+        if hasattr(self, "_multipart"):
+            await self._multipart.close()
+        await super().close()
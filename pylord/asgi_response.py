@@ -1,21 +1,42 @@
-from starlette.responses import Response as AsgiResponse
-import json
+from starlette.responses import Response as AsgiResponse, StreamingResponse
+from .headers import Headers
+from .serializers import default_serializer
+
+
+_content_type_headers = {}
+
+
+def content_type_header(content_type):
+    header = _content_type_headers.get(content_type)
+    if header is None:
+        header = content_type
+        if content_type.startswith("text/") and "charset=" not in content_type:
+            header = f"{content_type}; charset=utf-8"
+        header = (b"content-type", header.encode("latin-1"))
+        _content_type_headers[content_type] = header
+
+    return header
 
 
 class Response:
+    __slots__ = ("html", "json", "content", "text", "content_type", "status_code", "headers", "stream",
+                 "serializer")
 
-    def __init__(self):
+    def __init__(self, serializer=default_serializer):
         self.html = None
         self.json = None
         self.content = b''
         self.text = None
         self.content_type = None
         self.status_code = 200
+        self.headers = Headers()
+        self.stream = None
+        self.serializer = serializer
 
     def set_body_and_content_type(self):
         if self.json is not None:
-            self.content = json.dumps(self.json).encode()
-            self.content_type = "application/json"
+            self.content = self.serializer.dumps(self.json)
+            self.content_type = self.serializer.content_type
 
         if self.html is not None:
             self.content = self.html.encode()
@@ -25,11 +46,79 @@ class Response:
             self.content = self.text
             self.content_type = "text/plain"
 
-    def __call__(self, scope, receive, send):
+    def render(self):
         self.set_body_and_content_type()
+        self.json = self.html = self.text = None
+
+        if isinstance(self.content, str):
+            self.content = self.content.encode()
+
+        return self.content
+
+    def add_header(self, name, value):
+        current = self.headers.get(name)
+        if current is None:
+            self.headers[name] = value
+        elif isinstance(current, list):
+            current.append(value)
+        else:
+            self.headers[name] = [current, value]
+
+    def raw_headers(self, *defaults):
+        headers = list(defaults)
+        if self.headers:
+            names = {name.lower().encode("latin-1") for name in self.headers}
+            headers = [header for header in headers if header[0] not in names]
+
+            for name, value in self.headers.items():
+                name = name.lower().encode("latin-1")
+                if isinstance(value, list):
+                    headers.extend((name, item.encode("latin-1")) for item in value)
+                else:
+                    headers.append((name, value.encode("latin-1")))
+
+        return headers
+
+    async def __call__(self, scope, receive, send):
+        if self.stream is not None:
+            return await self.stream_response(scope, receive, send)
 
+        self.set_body_and_content_type()
+
+        if self.status_code < 100 or self.status_code > 599:
+            return await self.wrapper_response(scope, receive, send)
+
+        body = self.content
+        if isinstance(body, str):
+            body = body.encode()
+
+        if self.status_code < 200 or self.status_code in (204, 304):
+            await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers()})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        defaults = [(b"content-length", str(len(body)).encode("latin-1"))]
+        if self.content_type is not None:
+            defaults.append(content_type_header(self.content_type))
+
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers(*defaults)})
+        await send({"type": "http.response.body", "body": b"" if scope["method"] == "HEAD" else body})
+
+    def wrapper_response(self, scope, receive, send):
         response = AsgiResponse(
                 content=self.content, status_code=self.status_code, media_type=self.content_type
         )
+        response.raw_headers = self.raw_headers(*response.raw_headers)
+
+        return response(scope, receive, send)
+
+    def stream_response(self, scope, receive, send):
+        # StreamingResponse sends every chunk with more_body=True, so the server uses
+        # chunked transfer, and it stops iterating once the client disconnects
+        response = StreamingResponse(
+            content=self.stream, status_code=self.status_code,
+            media_type=self.content_type or "application/octet-stream"
+        )
+        response.raw_headers = self.raw_headers(*response.raw_headers)
 
         return response(scope, receive, send)
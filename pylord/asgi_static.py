@@ -0,0 +1,269 @@
+import mimetypes
+import mmap
+import os
+import threading
+import time
+from collections import OrderedDict
+from email.utils import formatdate
+from .compression import parse_accept_encoding
+from .conditional import etag_matches
+
+
+IMMUTABLE_CACHE_CONTROL = b"public, max-age=31536000, immutable"
+
+CHUNK_SIZE = 256 * 1024
+
+
+class StaticFile:
+    __slots__ = ("path", "size", "content_type", "etag", "last_modified", "variants", "immutable")
+
+    def __init__(self, path, stat, immutable=False):
+        content_type, _ = mimetypes.guess_type(path)
+        if content_type is None:
+            content_type = "application/octet-stream"
+        elif content_type.startswith("text/"):
+            content_type = f"{content_type}; charset=utf-8"
+
+        self.path = path
+        self.size = stat.st_size
+        self.content_type = content_type.encode("latin-1")
+        # strong, so that it can be used with If-Range
+        self.etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+        self.last_modified = formatdate(stat.st_mtime, usegmt=True)
+        self.variants = {}
+        self.immutable = immutable
+
+    def variant_etag(self, encoding):
+        # each encoding is its own representation and needs its own validator
+        return self.etag if encoding is None else f'{self.etag[:-1]}-{encoding}"'
+
+
+def get_header(scope, name):
+    for key, value in scope["headers"]:
+        if key == name:
+            return value.decode("latin-1")
+
+    return None
+
+
+def parse_range(header, size):
+    """
+    Returns ``(start, end)`` (inclusive) for a single satisfiable byte range,
+    ``None`` when the header should be ignored and ``False`` when it cannot
+    be satisfied.
+    """
+    unit, _, ranges = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in ranges:
+        return None
+
+    start, _, end = ranges.strip().partition("-")
+    try:
+        if not start:
+            suffix = int(end)
+            if suffix <= 0:
+                return False
+            return max(size - suffix, 0), size - 1
+
+        start = int(start)
+        end = int(end) if end else size - 1
+    except ValueError:
+        return None
+
+    if start >= size or end < start:
+        return False
+
+    return start, min(end, size - 1)
+
+
+class StaticFiles:
+    """
+    ASGI app serving a static directory.
+
+    With ``indexed`` the directory is scanned once at startup, including the
+    precompressed ``.br``/``.gz`` siblings written by ``collect_static``.
+    Otherwise file metadata is looked up on demand and kept in an LRU for
+    ``metadata_ttl`` seconds, so edits still show up in development. Bodies
+    go out through the server's zero-copy or path-send extensions when offered,
+    and as mmap-backed chunks otherwise.
+    """
+
+    def __init__(self, directory, prefix="/static", static_url=None, max_age=3600, indexed=False,
+                 metadata_cache_size=1024, metadata_ttl=2.0):
+        self.directory = os.path.abspath(directory)
+        self.prefix = prefix.rstrip("/")
+        self.static_url = static_url
+        self.cache_control = f"public, max-age={max_age}".encode("latin-1")
+        self.indexed = indexed
+        self.metadata_cache_size = metadata_cache_size
+        self.metadata_ttl = metadata_ttl
+        self.metadata = OrderedDict()
+        self.lock = threading.Lock()
+        self.files = self.scan() if indexed else {}
+
+    def scan(self):
+        files = {}
+        compressed = []
+
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                path = os.path.join(root, name)
+                url = f"{self.prefix}/{os.path.relpath(path, self.directory).replace(os.sep, '/')}"
+
+                if name.endswith((".gz", ".br")):
+                    compressed.append((url, path))
+                    continue
+
+                immutable = self.static_url is not None and self.static_url.is_immutable(url)
+                files[url] = StaticFile(path, os.stat(path), immutable)
+
+        for url, path in compressed:
+            base_url, ext = os.path.splitext(url)
+            static_file = files.get(base_url)
+            if static_file is None:
+                files[url] = StaticFile(path, os.stat(path))
+            else:
+                encoding = "br" if ext == ".br" else "gzip"
+                static_file.variants[encoding] = (path, os.path.getsize(path))
+
+        return files
+
+    def lookup(self, url):
+        if self.indexed:
+            return self.files.get(url)
+
+        now = time.monotonic()
+        with self.lock:
+            entry = self.metadata.get(url)
+            if entry is not None and entry[0] > now:
+                self.metadata.move_to_end(url)
+                return entry[1]
+
+        if url != self.prefix and not url.startswith(self.prefix + "/"):
+            return None
+
+        relative = url[len(self.prefix):].lstrip("/")
+        path = os.path.normpath(os.path.join(self.directory, relative))
+        if not path.startswith(self.directory + os.sep):
+            return None
+
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        if not os.path.isfile(path):
+            return None
+
+        static_file = StaticFile(path, stat)
+        with self.lock:
+            self.metadata[url] = (now + self.metadata_ttl, static_file)
+            self.metadata.move_to_end(url)
+            if len(self.metadata) > self.metadata_cache_size:
+                self.metadata.popitem(last=False)
+
+        return static_file
+
+    def choose_variant(self, static_file, scope):
+        if not static_file.variants:
+            return None, static_file.path, static_file.size
+
+        accept_encoding = get_header(scope, b"accept-encoding")
+        if not accept_encoding:
+            return None, static_file.path, static_file.size
+
+        accepted = parse_accept_encoding(accept_encoding)
+        for encoding in ("br", "gzip"):
+            if encoding in static_file.variants and accepted.get(encoding, 0.0) > 0:
+                path, size = static_file.variants[encoding]
+                return encoding, path, size
+
+        return None, static_file.path, static_file.size
+
+    def requested_range(self, static_file, scope):
+        range_header = get_header(scope, b"range")
+        if range_header is None:
+            return None
+
+        if_range = get_header(scope, b"if-range")
+        if if_range is not None and if_range != static_file.etag and if_range != static_file.last_modified:
+            return None
+
+        return parse_range(range_header, static_file.size)
+
+    async def __call__(self, scope, receive, send):
+        static_file = self.lookup(scope["path"])
+        if static_file is None or scope["method"] not in ("GET", "HEAD"):
+            status = 404 if static_file is None else 405
+            await send({"type": "http.response.start", "status": status,
+                        "headers": [(b"content-type", b"text/plain; charset=utf-8")]})
+            await send({"type": "http.response.body", "body": b"Not Found" if status == 404 else b""})
+            return
+
+        byte_range = self.requested_range(static_file, scope)
+        if byte_range is not None:
+            # ranges always refer to the identity encoding
+            encoding, path, count = None, static_file.path, static_file.size
+        else:
+            encoding, path, count = self.choose_variant(static_file, scope)
+        etag = static_file.variant_etag(encoding)
+
+        headers = [
+            (b"etag", etag.encode("latin-1")),
+            (b"last-modified", static_file.last_modified.encode("latin-1")),
+            (b"cache-control", IMMUTABLE_CACHE_CONTROL if static_file.immutable else self.cache_control),
+            (b"accept-ranges", b"bytes"),
+        ]
+        if static_file.variants:
+            headers.append((b"vary", b"Accept-Encoding"))
+
+        if etag_matches(get_header(scope, b"if-none-match"), etag):
+            await send({"type": "http.response.start", "status": 304, "headers": headers})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        if byte_range is False:
+            headers.append((b"content-range", f"bytes */{static_file.size}".encode("latin-1")))
+            await send({"type": "http.response.start", "status": 416, "headers": headers})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        headers.append((b"content-type", static_file.content_type))
+
+        if byte_range is not None:
+            status = 206
+            offset, count = byte_range[0], byte_range[1] - byte_range[0] + 1
+            headers.append((
+                b"content-range", f"bytes {byte_range[0]}-{byte_range[1]}/{static_file.size}".encode("latin-1")
+            ))
+        else:
+            status, offset = 200, 0
+            if encoding is not None:
+                headers.append((b"content-encoding", encoding.encode("latin-1")))
+
+        headers.append((b"content-length", str(count).encode("latin-1")))
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+
+        if scope["method"] == "HEAD" or count == 0:
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        await self.send_file(scope, send, path, offset, count)
+
+    async def send_file(self, scope, send, path, offset, count):
+        extensions = scope.get("extensions") or {}
+
+        if "http.response.pathsend" in extensions and offset == 0 and count == os.path.getsize(path):
+            await send({"type": "http.response.pathsend", "path": path})
+            return
+
+        with open(path, "rb") as f:
+            if "http.response.zerocopysend" in extensions:
+                await send({"type": "http.response.zerocopysend", "file": f, "offset": offset, "count": count})
+                return
+
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                end = offset + count
+                while offset < end:
+                    chunk_end = min(offset + CHUNK_SIZE, end)
+                    await send({"type": "http.response.body", "body": mapped[offset:chunk_end],
+                                "more_body": chunk_end < end})
+                    offset = chunk_end
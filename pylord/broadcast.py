@@ -0,0 +1,166 @@
+import asyncio
+from collections import deque
+from .serializers import get_serializer
+
+
+OVERFLOW_POLICIES = ("drop", "coalesce")
+
+# 1013 "Try Again Later", sent to clients that could not keep up
+SLOW_CLIENT_CLOSE_CODE = 1013
+
+
+class Subscription:
+    """
+    A subscriber's bounded send queue.
+
+    ``put`` never blocks the publisher. When the queue is full the subscriber
+    is either dropped or, with ``overflow="coalesce"``, its backlog is thrown
+    away so that only the latest message is sent.
+    """
+
+    def __init__(self, broadcast, channel, max_queue, overflow):
+        assert overflow in OVERFLOW_POLICIES, f"overflow must be one of {OVERFLOW_POLICIES}"
+
+        self.broadcast = broadcast
+        self.channel = channel
+        self.max_queue = max_queue
+        self.overflow = overflow
+        self.queue = deque()
+        self.ready = asyncio.Event()
+        self.closed = False
+        self.dropped = False
+        self.coalesced = 0
+
+    def put(self, message):
+        if self.closed:
+            return False
+
+        if len(self.queue) >= self.max_queue:
+            if self.overflow == "drop":
+                self.dropped = True
+                self.close()
+                return False
+
+            self.coalesced += len(self.queue)
+            self.queue.clear()
+
+        self.queue.append(message)
+        self.ready.set()
+        return True
+
+    def close(self):
+        self.closed = True
+        self.ready.set()
+        self.broadcast.unsubscribe(self)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        while not self.queue:
+            if self.closed:
+                raise StopAsyncIteration
+            self.ready.clear()
+            await self.ready.wait()
+
+        return self.queue.popleft()
+
+
+class Broadcast:
+    """
+    In-process publish/subscribe hub for WebSocket fan-out.
+
+    A published message is serialized into a single ASGI ``websocket.send``
+    message that is shared by every subscriber of the channel.
+    """
+
+    def __init__(self, serializer=None, max_queue=64, overflow="drop"):
+        self.serializer = serializer or get_serializer()
+        self.max_queue = max_queue
+        self.overflow = overflow
+        self.channels = {}
+        self.loop = None
+
+    def subscribe(self, channel, max_queue=None, overflow=None):
+        self.loop = asyncio.get_running_loop()
+
+        subscription = Subscription(
+            self, channel, max_queue or self.max_queue, overflow or self.overflow
+        )
+        self.channels.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        subscribers = self.channels.get(subscription.channel)
+        if subscribers is None:
+            return
+
+        subscribers.discard(subscription)
+        if not subscribers:
+            del self.channels[subscription.channel]
+
+    def encode(self, message):
+        if isinstance(message, str):
+            return {"type": "websocket.send", "text": message}
+        if isinstance(message, (bytes, bytearray, memoryview)):
+            return {"type": "websocket.send", "bytes": bytes(message)}
+
+        return {"type": "websocket.send", "text": self.serializer.dumps(message).decode()}
+
+    def publish(self, channel, message):
+        """
+        Queues ``message`` for every subscriber of ``channel``. Safe to call
+        from sync handlers running on worker threads.
+        """
+        if channel not in self.channels:
+            return
+
+        encoded = self.encode(message)
+
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            # subscriptions belong to the event loop, hand the fan-out over to it
+            if self.loop is not None and not self.loop.is_closed():
+                self.loop.call_soon_threadsafe(self.fan_out, channel, encoded)
+            return
+
+        self.fan_out(channel, encoded)
+
+    def fan_out(self, channel, encoded):
+        for subscription in list(self.channels.get(channel, ())):
+            subscription.put(encoded)
+
+    def subscriber_count(self, channel=None):
+        if channel is not None:
+            return len(self.channels.get(channel, ()))
+
+        return sum(len(subscribers) for subscribers in self.channels.values())
+
+    async def forward(self, websocket, channel, max_queue=None, overflow=None):
+        """
+        Sends the channel's messages to ``websocket`` until the client
+        disconnects. Incoming messages are read and discarded to notice the
+        disconnect, so the handler should not receive on the socket meanwhile.
+        """
+        subscription = self.subscribe(channel, max_queue, overflow)
+        watcher = asyncio.ensure_future(self.wait_disconnect(websocket, subscription))
+
+        try:
+            async for message in subscription:
+                await websocket.send(message)
+        finally:
+            watcher.cancel()
+            if not subscription.closed:
+                subscription.close()
+
+        if subscription.dropped:
+            await websocket.close(code=SLOW_CLIENT_CLOSE_CODE)
+
+    @staticmethod
+    async def wait_disconnect(websocket, subscription):
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                subscription.close()
+                return
@@ -0,0 +1,120 @@
+import threading
+import time
+from collections import OrderedDict
+from .headers import Headers
+
+
+UNCACHEABLE_DIRECTIVES = {"private", "no-store", "no-cache"}
+
+
+def is_cacheable(headers):
+    """
+    Whether a response may be replayed to other clients: responses setting
+    cookies, marked private/no-store/no-cache or varying on everything are not.
+    """
+    for name, value in headers.items():
+        name = name.lower()
+        if name == "set-cookie":
+            return False
+        if name == "cache-control":
+            directives = {directive.split("=", 1)[0].strip().lower() for directive in value.split(",")}
+            if directives & UNCACHEABLE_DIRECTIVES:
+                return False
+        if name == "vary" and "*" in (item.strip() for item in value.split(",")):
+            return False
+
+    return True
+
+
+class ResponseCache:
+    """
+    In-memory cache of fully rendered responses.
+
+    Entries are keyed by method, path, query string and the values of the
+    ``vary`` request headers, expire after ``ttl`` seconds and are evicted in
+    LRU order once ``max_size`` is reached.
+    """
+
+    def __init__(self, ttl=60, max_size=1024, vary=()):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.vary = tuple(vary)
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def make_key(self, method, path, query_string, headers):
+        if self.vary:
+            return method, path, query_string, tuple(headers.get(name) for name in self.vary)
+
+        return method, path, query_string
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            if entry[0] < time.monotonic():
+                del self.entries[key]
+                self.misses += 1
+                return None
+
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def set(self, key, status_code, content_type, body, headers):
+        entry = (time.monotonic() + self.ttl, status_code, content_type, body, headers)
+
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def store(self, key, response):
+        if response.status_code != 200 or response.stream is not None or not is_cacheable(response.headers):
+            return
+
+        body = response.render()
+        self.set(key, response.status_code, response.content_type, body, dict(response.headers))
+
+    @staticmethod
+    def restore(entry, response, body_attr="body"):
+        _, response.status_code, response.content_type, body, headers = entry
+        setattr(response, body_attr, body)
+        response.headers = Headers(headers)
+
+    def invalidate(self, path=None):
+        with self.lock:
+            if path is None:
+                self.entries.clear()
+                return
+
+            for key in [key for key in self.entries if key[1] == path]:
+                del self.entries[key]
+
+    @property
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": len(self.entries),
+        }
+
+
+def make_cache(cache):
+    if cache is None or cache is False:
+        return None
+    if cache is True:
+        return ResponseCache()
+    if isinstance(cache, (int, float)):
+        return ResponseCache(ttl=cache)
+
+    return cache
@@ -0,0 +1,150 @@
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+from .middleware import Middleware
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+DEFAULT_CONTENT_TYPES = (
+    "text/",
+    "application/json",
+    "application/javascript",
+    "application/xml",
+    "image/svg+xml",
+)
+
+
+def parse_accept_encoding(header):
+    encodings = {}
+    for item in header.split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        encodings[name.strip().lower()] = quality
+
+    return encodings
+
+
+class Compressor:
+    """
+    Compresses response bodies with brotli (when importable) or gzip.
+
+    Compressed bodies are kept in an LRU cache keyed by encoding and body digest,
+    so identical payloads are compressed only once.
+    """
+
+    def __init__(self, minimum_size=500, content_types=DEFAULT_CONTENT_TYPES, gzip_level=6,
+                 brotli_quality=4, cache_size=256):
+        self.minimum_size = minimum_size
+        self.content_types = tuple(content_types)
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+        self._negotiated = {}
+
+    def negotiate(self, accept_encoding):
+        if not accept_encoding:
+            return None
+
+        encoding = self._negotiated.get(accept_encoding, False)
+        if encoding is not False:
+            return encoding
+
+        accepted = parse_accept_encoding(accept_encoding)
+        encoding = None
+        for candidate in ("br", "gzip"):
+            if candidate == "br" and brotli is None:
+                continue
+            if accepted.get(candidate, accepted.get("*", 0.0)) > 0:
+                encoding = candidate
+                break
+
+        if len(self._negotiated) < 1024:
+            self._negotiated[accept_encoding] = encoding
+
+        return encoding
+
+    def should_compress(self, status_code, content_type, body):
+        if not 200 <= status_code < 300 or status_code in (204, 206):
+            return False
+        if len(body) < self.minimum_size or content_type is None:
+            return False
+
+        return content_type.startswith(self.content_types)
+
+    def compress(self, body, encoding):
+        key = (encoding, hashlib.blake2b(body, digest_size=16).digest())
+
+        with self.lock:
+            compressed = self.cache.get(key)
+            if compressed is not None:
+                self.cache.move_to_end(key)
+                return compressed
+
+        if encoding == "br":
+            compressed = brotli.compress(body, quality=self.brotli_quality)
+        else:
+            compressed = gzip.compress(body, compresslevel=self.gzip_level, mtime=0)
+
+        with self.lock:
+            self.cache[key] = compressed
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+
+        return compressed
+
+    def compress_response(self, response, accept_encoding, body_attr="body", default_content_type=None):
+        if response.stream is not None or "Content-Encoding" in response.headers:
+            return
+
+        body = response.render()
+        content_type = response.content_type or default_content_type
+        if not self.should_compress(response.status_code, content_type, body):
+            return
+
+        # the body depends on Accept-Encoding even when it goes out uncompressed,
+        # shared caches must keep the variants apart
+        add_vary(response.headers, "Accept-Encoding")
+
+        encoding = self.negotiate(accept_encoding)
+        if encoding is None:
+            return
+
+        setattr(response, body_attr, self.compress(body, encoding))
+        response.headers["Content-Encoding"] = encoding
+
+        # the encoded body is no longer byte-identical to the one a strong ETag described
+        etag = response.headers.get("ETag")
+        if etag is not None and not etag.startswith("W/"):
+            response.headers["ETag"] = f"W/{etag}"
+
+
+def add_vary(headers, name):
+    vary = headers.get("Vary")
+    if not vary:
+        headers["Vary"] = name
+    elif name.lower() not in (item.strip().lower() for item in vary.split(",")):
+        headers["Vary"] = f"{vary}, {name}"
+
+
+class CompressionMiddleware(Middleware):
+    def __init__(self, app, **options):
+        super().__init__(app)
+        self.compressor = Compressor(**options)
+
+    def process_response(self, req, resp):
+        self.compressor.compress_response(
+            resp, req.headers.get("Accept-Encoding"), default_content_type="text/html"
+        )
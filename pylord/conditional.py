@@ -0,0 +1,76 @@
+import hashlib
+from email.utils import parsedate_to_datetime
+
+
+def weak_etag(body):
+    return f'W/"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+
+
+def quote_etag(etag):
+    etag = str(etag)
+    if etag.startswith(('"', 'W/"')):
+        return etag
+
+    return f'"{etag}"'
+
+
+def etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+
+    # If-None-Match always uses the weak comparison function
+    etag = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+
+    return False
+
+
+def not_modified_since(if_modified_since, last_modified):
+    try:
+        return parsedate_to_datetime(last_modified) <= parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+
+
+def is_fresh(request_headers, response_headers):
+    etag = response_headers.get("ETag")
+    if_none_match = request_headers.get("If-None-Match")
+    if if_none_match is not None:
+        return etag is not None and etag_matches(if_none_match, etag)
+
+    last_modified = response_headers.get("Last-Modified")
+    if_modified_since = request_headers.get("If-Modified-Since")
+    if if_modified_since is not None and last_modified is not None:
+        return not_modified_since(if_modified_since, last_modified)
+
+    return False
+
+
+def not_modified(response, body_attr="body"):
+    response.status_code = 304
+    response.json = response.html = response.text = None
+    setattr(response, body_attr, b"")
+    return response
+
+
+def is_conditional(request, response):
+    return request.method in ("GET", "HEAD") and response.status_code == 200 and response.stream is None
+
+
+def add_weak_etag(request, response):
+    if is_conditional(request, response) and "ETag" not in response.headers:
+        response.headers["ETag"] = weak_etag(response.render())
+
+
+def evaluate_preconditions(request, response, body_attr="body"):
+    if is_conditional(request, response) and is_fresh(request.headers, response.headers):
+        return not_modified(response, body_attr)
+
+    return response
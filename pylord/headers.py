@@ -0,0 +1,48 @@
+from collections.abc import MutableMapping
+
+
+class Headers(MutableMapping):
+    """
+    Response headers with case-insensitive names. A header is sent with the
+    name it was first set with; a value may be a list for repeated headers.
+    """
+
+    __slots__ = ("store",)
+
+    def __init__(self, headers=None):
+        self.store = {}
+        if headers:
+            self.update(headers)
+
+    def __getitem__(self, name):
+        return self.store[name.lower()][1]
+
+    def __setitem__(self, name, value):
+        key = name.lower()
+        current = self.store.get(key)
+        self.store[key] = (name if current is None else current[0], value)
+
+    def __delitem__(self, name):
+        del self.store[name.lower()]
+
+    def __contains__(self, name):
+        return isinstance(name, str) and name.lower() in self.store
+
+    def __iter__(self):
+        return (name for name, _ in self.store.values())
+
+    def __len__(self):
+        return len(self.store)
+
+    def get(self, name, default=None):
+        item = self.store.get(name.lower())
+        return default if item is None else item[1]
+
+    def items(self):
+        return self.store.values()
+
+    def copy(self):
+        return Headers(self)
+
+    def __repr__(self):
+        return f"Headers({dict(self.store.values())!r})"
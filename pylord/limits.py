@@ -0,0 +1,189 @@
+import asyncio
+import threading
+from collections import deque
+from .metrics import escape_label
+
+
+class ConcurrencyLimiter:
+    """
+    Caps the number of requests handled at once by a WSGI app or route.
+
+    Up to ``max_queue`` requests beyond ``max_in_flight`` wait for a slot, at
+    most ``queue_timeout`` seconds; everything else is rejected right away.
+    """
+
+    def __init__(self, max_in_flight, max_queue=0, queue_timeout=None, retry_after=1):
+        assert max_in_flight > 0, "max_in_flight must be positive"
+
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self.in_flight = 0
+        self.queued = 0
+        self.admitted = 0
+        self.rejected = {"queue_full": 0, "timeout": 0}
+        self.condition = threading.Condition()
+
+    def acquire(self):
+        with self.condition:
+            if self.in_flight < self.max_in_flight:
+                self.in_flight += 1
+                self.admitted += 1
+                return True
+
+            if self.queued >= self.max_queue:
+                self.rejected["queue_full"] += 1
+                return False
+
+            self.queued += 1
+            try:
+                admitted = self.condition.wait_for(
+                    lambda: self.in_flight < self.max_in_flight, self.queue_timeout
+                )
+            finally:
+                self.queued -= 1
+
+            if not admitted:
+                self.rejected["timeout"] += 1
+                return False
+
+            self.in_flight += 1
+            self.admitted += 1
+            return True
+
+    def release(self):
+        with self.condition:
+            self.in_flight -= 1
+            self.condition.notify()
+
+
+class AsyncConcurrencyLimiter(ConcurrencyLimiter):
+    """
+    ``ConcurrencyLimiter`` for the ASGI app. Waiting requests are admitted in
+    arrival order, a released slot is handed straight to the oldest waiter.
+    """
+
+    def __init__(self, max_in_flight, max_queue=0, queue_timeout=None, retry_after=1):
+        super().__init__(max_in_flight, max_queue, queue_timeout, retry_after)
+        self.waiters = deque()
+
+    async def acquire(self):
+        if self.in_flight < self.max_in_flight and not self.waiters:
+            self.in_flight += 1
+            self.admitted += 1
+            return True
+
+        if len(self.waiters) >= self.max_queue:
+            self.rejected["queue_full"] += 1
+            return False
+
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters.append(waiter)
+        self.queued = len(self.waiters)
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.pass_on(waiter)
+            self.rejected["timeout"] += 1
+            return False
+        except asyncio.CancelledError:
+            self.pass_on(waiter)
+            raise
+        finally:
+            if waiter in self.waiters:
+                self.waiters.remove(waiter)
+            self.queued = len(self.waiters)
+
+        self.admitted += 1
+        return True
+
+    def pass_on(self, waiter):
+        # the slot may have been handed over just before the wait was abandoned
+        if waiter.done() and not waiter.cancelled():
+            self.release()
+
+    def release(self):
+        while self.waiters:
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                # the slot passes to the waiter, in_flight stays the same
+                waiter.set_result(None)
+                self.queued = len(self.waiters)
+                return
+
+        self.in_flight -= 1
+        self.queued = 0
+
+
+def make_limiter(limit, limiter_cls=ConcurrencyLimiter):
+    if limit is None or limit is False:
+        return None
+    if isinstance(limit, ConcurrencyLimiter):
+        if isinstance(limit, AsyncConcurrencyLimiter) != issubclass(limiter_cls, AsyncConcurrencyLimiter):
+            raise TypeError(f"This app needs a {limiter_cls.__name__}, got {type(limit).__name__}")
+        return limit
+
+    return limiter_cls(limit)
+
+
+def overloaded(response, limiter):
+    response.status_code = 503
+    response.headers["Retry-After"] = str(limiter.retry_after)
+    response.text = "Service Unavailable"
+    return response
+
+
+def limited(limiter, handle_request, response_cls, serializer):
+    def handle_limited_request(request):
+        if not limiter.acquire():
+            return overloaded(response_cls(serializer), limiter)
+
+        try:
+            return handle_request(request)
+        finally:
+            limiter.release()
+
+    return handle_limited_request
+
+
+def limited_async(limiter, handle_request, response_cls, serializer):
+    async def handle_limited_request(request):
+        if not await limiter.acquire():
+            return overloaded(response_cls(serializer), limiter)
+
+        try:
+            return await handle_request(request)
+        finally:
+            limiter.release()
+
+    return handle_limited_request
+
+
+def collect_limits(limiters):
+    in_flight = [
+        "# HELP pylord_limit_in_flight Requests currently admitted, by limit scope.",
+        "# TYPE pylord_limit_in_flight gauge",
+    ]
+    queued = [
+        "# HELP pylord_limit_queued Requests waiting for a slot, by limit scope.",
+        "# TYPE pylord_limit_queued gauge",
+    ]
+    admitted = [
+        "# HELP pylord_limit_admitted_total Requests admitted, by limit scope.",
+        "# TYPE pylord_limit_admitted_total counter",
+    ]
+    rejected = [
+        "# HELP pylord_limit_rejected_total Requests rejected with 503, by limit scope and reason.",
+        "# TYPE pylord_limit_rejected_total counter",
+    ]
+
+    for scope, limiter in limiters:
+        label = escape_label(scope)
+        in_flight.append(f'pylord_limit_in_flight{{scope="{label}"}} {limiter.in_flight}')
+        queued.append(f'pylord_limit_queued{{scope="{label}"}} {limiter.queued}')
+        admitted.append(f'pylord_limit_admitted_total{{scope="{label}"}} {limiter.admitted}')
+        for reason, count in limiter.rejected.items():
+            rejected.append(f'pylord_limit_rejected_total{{scope="{label}",reason="{reason}"}} {count}')
+
+    return in_flight + queued + admitted + rejected
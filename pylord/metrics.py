@@ -0,0 +1,175 @@
+import contextvars
+import threading
+import time
+from bisect import bisect_left
+
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+UNMATCHED_ROUTE = "__unmatched__"
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+STATUS_CLASSES = ("1xx", "2xx", "3xx", "4xx", "5xx")
+
+_timings = contextvars.ContextVar("pylord_timings", default=None)
+
+
+def current_timings():
+    return _timings.get()
+
+
+def start_timings():
+    timings = {}
+    return timings, _timings.set(timings)
+
+
+def stop_timings(token):
+    _timings.reset(token)
+
+
+def record_timing(timings, phase, seconds):
+    timings[phase] = timings.get(phase, 0.0) + seconds
+
+
+def server_timing_header(timings):
+    return ", ".join(f"{phase};dur={seconds * 1000:.3f}" for phase, seconds in timings.items())
+
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class RouteStats:
+    __slots__ = ("statuses", "buckets", "latency_sum", "size_sum")
+
+    def __init__(self, bucket_count):
+        self.statuses = [0] * len(STATUS_CLASSES)
+        self.buckets = [0] * (bucket_count + 1)
+        self.latency_sum = 0.0
+        self.size_sum = 0
+
+
+class Metrics:
+    """
+    Per-route request counters, latency histograms and response sizes.
+
+    Every thread records into its own shard, so the hot path takes no lock;
+    shards are only summed up when the metrics are rendered.
+    """
+
+    def __init__(self, path="/metrics", buckets=DEFAULT_BUCKETS, server_timing=False):
+        self.path = path
+        self.buckets = tuple(sorted(buckets))
+        self.server_timing = server_timing
+        self.local = threading.local()
+        self.shards = []
+        self.lock = threading.Lock()
+        self.collectors = []
+
+    def shard(self):
+        shard = getattr(self.local, "routes", None)
+        if shard is None:
+            shard = self.local.routes = {}
+            with self.lock:
+                self.shards.append(shard)
+
+        return shard
+
+    def observe(self, route, status_code, seconds, size):
+        shard = self.shard()
+        stats = shard.get(route)
+        if stats is None:
+            stats = shard[route] = RouteStats(len(self.buckets))
+
+        stats.statuses[min(max(status_code // 100, 1), 5) - 1] += 1
+        stats.buckets[bisect_left(self.buckets, seconds)] += 1
+        stats.latency_sum += seconds
+        stats.size_sum += size
+
+    def add_collector(self, collector):
+        self.collectors.append(collector)
+
+    def collect(self):
+        with self.lock:
+            shards = list(self.shards)
+
+        routes = {}
+        for shard in shards:
+            for route, stats in list(shard.items()):
+                total = routes.get(route)
+                if total is None:
+                    total = routes[route] = RouteStats(len(self.buckets))
+
+                total.statuses = [a + b for a, b in zip(total.statuses, stats.statuses)]
+                total.buckets = [a + b for a, b in zip(total.buckets, stats.buckets)]
+                total.latency_sum += stats.latency_sum
+                total.size_sum += stats.size_sum
+
+        return routes
+
+    def render(self):
+        routes = self.collect()
+
+        requests = [
+            "# HELP pylord_requests_total Requests handled, by route template and status class.",
+            "# TYPE pylord_requests_total counter",
+        ]
+        latency = [
+            "# HELP pylord_request_duration_seconds Request latency, by route template.",
+            "# TYPE pylord_request_duration_seconds histogram",
+        ]
+        sizes = [
+            "# HELP pylord_response_size_bytes Response body size, by route template.",
+            "# TYPE pylord_response_size_bytes summary",
+        ]
+
+        for route, stats in sorted(routes.items()):
+            label = escape_label(route)
+            for status_class, count in zip(STATUS_CLASSES, stats.statuses):
+                if count:
+                    requests.append(f'pylord_requests_total{{route="{label}",status="{status_class}"}} {count}')
+
+            cumulative = 0
+            for bound, count in zip(self.buckets, stats.buckets):
+                cumulative += count
+                latency.append(f'pylord_request_duration_seconds_bucket{{route="{label}",le="{bound}"}} {cumulative}')
+
+            total = cumulative + stats.buckets[-1]
+            latency.append(f'pylord_request_duration_seconds_bucket{{route="{label}",le="+Inf"}} {total}')
+            latency.append(f'pylord_request_duration_seconds_sum{{route="{label}"}} {stats.latency_sum}')
+            latency.append(f'pylord_request_duration_seconds_count{{route="{label}"}} {total}')
+
+            sizes.append(f'pylord_response_size_bytes_sum{{route="{label}"}} {stats.size_sum}')
+            sizes.append(f'pylord_response_size_bytes_count{{route="{label}"}} {total}')
+
+        lines = requests + latency + sizes
+        for collector in self.collectors:
+            lines.extend(collector())
+
+        return "\n".join(lines) + "\n"
+
+
+def instrument_router(app, route_store):
+    """
+    Wraps ``app.find_handler`` so that routing time and the matched route
+    template are recorded for the current request.
+    """
+    find_handler = app.find_handler
+    if getattr(find_handler, "instrumented", False):
+        return
+
+    def timed_find_handler(request):
+        started = time.perf_counter()
+        handler_data, kwargs = find_handler(request)
+
+        timings = _timings.get()
+        if timings is not None:
+            record_timing(timings, "routing", time.perf_counter() - started)
+        if handler_data is not None:
+            route_store(request)["pylord.route"] = handler_data["path"]
+
+        return handler_data, kwargs
+
+    timed_find_handler.instrumented = True
+    app.find_handler = timed_find_handler
@@ -1,13 +1,14 @@
-from webob import Request
+from .request import Request
+
+
+def overrides(middleware, name, base):
+    return getattr(type(middleware), name) is not getattr(base, name)
 
 
 class Middleware:
     def __init__(self, app):
         self.app = app
 
-    def add(self, middleware_cls):
-        self.app = middleware_cls(self.app)
-
     def process_request(self, req):
         pass
 
@@ -15,13 +16,83 @@ class Middleware:
         pass
 
     def handle_request(self, request):
-        self.process_request(request)
-        response = self.app.handle_request(request)
+        response = self.process_request(request)
+        if response is None:
+            response = self.app.handle_request(request)
         self.process_response(request, response)
 
         return response
 
+
+class Pipeline:
+    """
+    The middleware added to an app, compiled into flat lists of the hooks
+    each one overrides. ``middleware_base`` is the class user middleware
+    derives from.
+    """
+
+    middleware_base = Middleware
+
+    def __init__(self, app):
+        self.app = app
+        self.stack = []
+        self.request_hooks = []
+        self.response_hooks = []
+        self.nested = None
+
+    def add(self, middleware_cls):
+        self.stack.append(middleware_cls(self.app))
+        self.compile()
+
+    def compile(self):
+        base = self.middleware_base
+
+        # middleware that replaces handle_request needs the old nested layout to wrap the inner layers
+        if any(overrides(middleware, "handle_request", base) for middleware in self.stack):
+            inner = self.app
+            for middleware in self.stack:
+                middleware.app = inner
+                inner = middleware
+            self.nested = inner
+            return
+
+        self.nested = None
+
+        # the last added middleware is the outermost layer, so its process_request runs first
+        layers = list(reversed(self.stack))
+        self.request_hooks = [
+            (depth, middleware.process_request) for depth, middleware in enumerate(layers)
+            if overrides(middleware, "process_request", base)
+        ]
+        self.response_hooks = [
+            (depth, middleware.process_response) for depth, middleware in reversed(list(enumerate(layers)))
+            if overrides(middleware, "process_response", base)
+        ]
+
+
+class MiddlewarePipeline(Pipeline):
+    def handle_request(self, request):
+        if self.nested is not None:
+            return self.nested.handle_request(request)
+
+        # a process_request hook may answer the request itself; the handler and the inner
+        # layers are skipped then, and only the layers it passed through see the response
+        reached = len(self.stack)
+        for depth, hook in self.request_hooks:
+            response = hook(request)
+            if response is not None:
+                reached = depth
+                break
+        else:
+            response = self.app.handle_request(request)
+
+        for depth, hook in self.response_hooks:
+            if depth <= reached:
+                hook(request, response)
+
+        return response
+
     def __call__(self, environ, start_response):
         request = Request(environ)
-        response = self.app.handle_request(request)
+        response = self.handle_request(request)
         return response(environ, start_response)
@@ -0,0 +1,205 @@
+import re
+from tempfile import SpooledTemporaryFile
+from starlette.datastructures import FormData, Headers, UploadFile
+
+
+DEFAULT_SPOOL_SIZE = 1024 * 1024
+
+MAX_HEADER_SIZE = 16 * 1024
+
+OPTION_RE = re.compile(r';\s*([\w!#$%&\'*+.^`|~-]+)\s*=\s*("(?:[^"\\]|\\.)*"|[^;]*)')
+
+
+class MultipartError(ValueError):
+    pass
+
+
+def parse_options_header(value):
+    """
+    Splits ``form-data; name="file"; filename="a.txt"`` into its value and a
+    dict of lowercased options.
+    """
+    main, _, rest = value.partition(";")
+    options = {}
+    for name, option in OPTION_RE.findall(";" + rest):
+        option = option.strip()
+        if option[:1] == '"':
+            option = option[1:-1].replace('\\"', '"').replace("\\\\", "\\")
+        options[name.lower()] = option
+
+    return main.strip().lower(), options
+
+
+def get_boundary(content_type):
+    media_type, options = parse_options_header(content_type or "")
+    boundary = options.get("boundary")
+    if media_type != "multipart/form-data" or not boundary:
+        raise MultipartError("Expected a multipart/form-data body with a boundary")
+
+    return boundary.encode("latin-1")
+
+
+class MultipartParser:
+    """
+    Incremental multipart/form-data parser.
+
+    ``feed`` takes the body in chunks of any size and returns the events it
+    could complete: ``("part", headers)``, ``("data", bytes)`` and
+    ``("end", None)``. Only a delimiter's worth of bytes is held back between
+    chunks, so memory use does not depend on the size of a part.
+    """
+
+    PREAMBLE, DELIMITER, HEADERS, BODY, DONE = range(5)
+
+    def __init__(self, boundary):
+        self.delimiter = b"--" + boundary
+        self.body_delimiter = b"\r\n" + self.delimiter
+        self.buffer = bytearray()
+        self.state = self.PREAMBLE
+
+    def feed(self, data):
+        self.buffer += data
+        events = []
+        buffer = self.buffer
+
+        while True:
+            if self.state == self.PREAMBLE:
+                index = buffer.find(self.delimiter)
+                if index == -1:
+                    del buffer[:max(len(buffer) - len(self.delimiter) + 1, 0)]
+                    break
+                del buffer[:index + len(self.delimiter)]
+                self.state = self.DELIMITER
+
+            elif self.state == self.DELIMITER:
+                if len(buffer) < 2:
+                    break
+                if buffer[:2] == b"--":
+                    self.state = self.DONE
+                    continue
+
+                # a delimiter may be followed by transport padding before its line break
+                index = buffer.find(b"\r\n")
+                if index == -1:
+                    if len(buffer) > MAX_HEADER_SIZE:
+                        raise MultipartError("Malformed multipart delimiter")
+                    break
+                del buffer[:index + 2]
+                self.state = self.HEADERS
+
+            elif self.state == self.HEADERS:
+                if buffer[:2] == b"\r\n":
+                    del buffer[:2]
+                    events.append(("part", []))
+                    self.state = self.BODY
+                    continue
+
+                index = buffer.find(b"\r\n\r\n")
+                if index == -1:
+                    if len(buffer) > MAX_HEADER_SIZE:
+                        raise MultipartError("Multipart part headers too large")
+                    break
+
+                events.append(("part", self.parse_headers(bytes(buffer[:index]))))
+                del buffer[:index + 4]
+                self.state = self.BODY
+
+            elif self.state == self.BODY:
+                index = buffer.find(self.body_delimiter)
+                if index == -1:
+                    # keep enough bytes to recognize a delimiter split across chunks
+                    safe = len(buffer) - len(self.body_delimiter) + 1
+                    if safe > 0:
+                        events.append(("data", bytes(buffer[:safe])))
+                        del buffer[:safe]
+                    break
+
+                if index:
+                    events.append(("data", bytes(buffer[:index])))
+                events.append(("end", None))
+                del buffer[:index + len(self.body_delimiter)]
+                self.state = self.DELIMITER
+
+            else:
+                buffer.clear()
+                break
+
+        return events
+
+    def close(self):
+        if self.state != self.DONE:
+            raise MultipartError("Multipart body ended unexpectedly")
+
+    @staticmethod
+    def parse_headers(block):
+        headers = []
+        for line in block.split(b"\r\n"):
+            name, separator, value = line.partition(b":")
+            if not separator:
+                raise MultipartError("Malformed multipart part header")
+            headers.append((name.strip().lower().decode("latin-1"), value.strip().decode("utf-8", "replace")))
+
+        return headers
+
+
+async def parse_multipart(chunks, boundary, spool_size=DEFAULT_SPOOL_SIZE, max_fields=1000, max_files=1000,
+                          max_field_size=1024 * 1024):
+    """
+    Parses a multipart body from the async iterable ``chunks`` into a
+    ``FormData``. Files are written to ``SpooledTemporaryFile``s that move to
+    disk once they grow past ``spool_size``; plain fields stay in memory and
+    are limited to ``max_field_size`` bytes.
+    """
+    parser = MultipartParser(boundary)
+    items = []
+    fields = files = 0
+    name = upload = field = None
+
+    try:
+        async for chunk in chunks:
+            for event, value in parser.feed(chunk):
+                if event == "part":
+                    _, options = parse_options_header(dict(value).get("content-disposition", ""))
+                    name = options.get("name", "")
+                    if "filename" in options:
+                        files += 1
+                        if files > max_files:
+                            raise MultipartError(f"Too many files, the limit is {max_files}")
+                        upload = UploadFile(
+                            SpooledTemporaryFile(max_size=spool_size), size=0, filename=options["filename"],
+                            headers=Headers(raw=[(key.encode("latin-1"), item.encode("latin-1", "replace"))
+                                                 for key, item in value])
+                        )
+                    else:
+                        fields += 1
+                        if fields > max_fields:
+                            raise MultipartError(f"Too many fields, the limit is {max_fields}")
+                        field = bytearray()
+
+                elif event == "data":
+                    if upload is not None:
+                        await upload.write(value)
+                    else:
+                        field += value
+                        if len(field) > max_field_size:
+                            raise MultipartError(f"Field {name!r} exceeds {max_field_size} bytes")
+
+                else:
+                    if upload is not None:
+                        await upload.seek(0)
+                        items.append((name, upload))
+                        upload = None
+                    else:
+                        items.append((name, field.decode("utf-8", "replace")))
+                        field = None
+
+        parser.close()
+    except BaseException:
+        if upload is not None:
+            await upload.close()
+        for _, item in items:
+            if isinstance(item, UploadFile):
+                await item.close()
+        raise
+
+    return FormData(items)
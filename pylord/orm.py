@@ -1,41 +1,162 @@
 import sqlite3
+import contextvars
+import functools
+import itertools
 import inspect
+import threading
+import time
+from contextlib import contextmanager
+from .metrics import current_timings, record_timing
+
+
+# stays below SQLite's default limit of 999 bound parameters
+IN_BATCH_SIZE = 900
+
+
+def batched(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+ISOLATION_LEVELS = ("DEFERRED", "IMMEDIATE", "EXCLUSIVE")
 
 
 class Database:
-    def __init__(self, path):
-        self.conn = sqlite3.Connection(path)
+    def __init__(self, path, isolation="DEFERRED"):
+        isolation = isolation.upper()
+        if isolation not in ISOLATION_LEVELS:
+            raise ValueError(f"isolation must be one of {', '.join(ISOLATION_LEVELS)}")
+
+        # sync ASGI handlers run on worker threads, sqlite serializes access to the connection itself.
+        # Transactions are managed explicitly, a statement outside of one commits on its own.
+        self.conn = sqlite3.Connection(path, check_same_thread=False, isolation_level=None)
+        self.isolation = isolation
+        # taken by every statement and held for the whole of a transaction, so that
+        # other threads using the connection cannot slip their statements into it
+        self.lock = threading.RLock()
+        # the lock is reentrant per thread and coroutines on the event loop share one,
+        # so the owner of the open transaction is also tracked per task through a context var
+        self.owner = None
+        self.owner_thread = None
+        self.current = contextvars.ContextVar("pylord_transaction", default=None)
+        self.savepoints = itertools.count()
+
+    @property
+    def in_transaction(self):
+        return self.owner is not None and self.current.get() is self.owner
+
+    def check_owner(self):
+        owner = self.owner
+        if owner is not None and self.owner_thread == threading.get_ident() and self.current.get() is not owner:
+            raise RuntimeError("Another task on this thread has a transaction open on this database")
+
+    @contextmanager
+    def transaction(self):
+        """
+        Runs the block in a transaction, committed when the outermost block
+        exits and rolled back if it raises. Nested blocks use savepoints, so
+        an inner failure only undoes the inner block.
+        """
+        self.check_owner()
+        with self.lock:
+            if self.in_transaction:
+                yield from self._savepoint()
+                return
+
+            self.execute(f"BEGIN {self.isolation}")
+            self.owner, self.owner_thread = object(), threading.get_ident()
+            token = self.current.set(self.owner)
+
+            try:
+                try:
+                    yield self
+                except BaseException:
+                    self.execute("ROLLBACK")
+                    raise
+
+                try:
+                    self.execute("COMMIT")
+                except BaseException:
+                    self.execute("ROLLBACK")
+                    raise
+            finally:
+                self.owner = self.owner_thread = None
+                self.current.reset(token)
+
+    def _savepoint(self):
+        savepoint = f"pylord_{next(self.savepoints)}"
+        self.execute(f"SAVEPOINT {savepoint}")
+
+        try:
+            yield self
+        except BaseException:
+            self.execute(f"ROLLBACK TO SAVEPOINT {savepoint}")
+            self.execute(f"RELEASE SAVEPOINT {savepoint}")
+            raise
+
+        self.execute(f"RELEASE SAVEPOINT {savepoint}")
+
+    def execute(self, sql, params=()):
+        self.check_owner()
+        started = time.perf_counter()
+        with self.lock:
+            cursor = self.conn.execute(sql, params)
+        self._record_db_time(started)
+
+        return cursor
+
+    def executemany(self, sql, seq_of_params):
+        self.check_owner()
+        started = time.perf_counter()
+        with self.lock:
+            cursor = self.conn.executemany(sql, seq_of_params)
+        self._record_db_time(started)
+
+        return cursor
+
+    def fetchall(self, sql, params=()):
+        self.check_owner()
+        started = time.perf_counter()
+        with self.lock:
+            rows = self.conn.execute(sql, params).fetchall()
+        self._record_db_time(started)
+
+        return rows
+
+    def fetchone(self, sql, params=()):
+        self.check_owner()
+        started = time.perf_counter()
+        with self.lock:
+            row = self.conn.execute(sql, params).fetchone()
+        self._record_db_time(started)
+
+        return row
+
+    @staticmethod
+    def _record_db_time(started):
+        timings = current_timings()
+        if timings is not None:
+            record_timing(timings, "db", time.perf_counter() - started)
 
     @property
     def tables(self):
         SELECT_TABLE_SQL = "SELECT name FROM sqlite_master WHERE type = 'table' ;"
-        return [row[0] for row in self.conn.execute(SELECT_TABLE_SQL).fetchall()]
+        return [row[0] for row in self.fetchall(SELECT_TABLE_SQL)]
 
     def create(self, table):
-        self.conn.execute(table._get_create_sql())
+        self.execute(table._get_create_sql())
 
     def save(self, instance):
         sql, values = instance._get_insert_sql()
-        curser = self.conn.execute(sql, values)
-        self.conn.commit()
+        # a single statement commits by itself unless a transaction is open
+        curser = self.execute(sql, values)
         instance._data["id"] = curser.lastrowid
 
-    def all(self, table):
-        sql, fields = table._get_select_all_sql()
-
-        result = []
-        for row in self.conn.execute(sql).fetchall():
-            instance = table()
-            for field, value in zip(fields, row):
-                if field.endswith("_id"):
-                    field = field[:-3]
-                    fk = getattr(table, field)
-                    value = self.get(fk.table, id=value)
-                setattr(instance, field, value)
-
-            result.append(instance)
+    def all(self, table, select_related=(), prefetch_related=()):
+        if not select_related and not prefetch_related:
+            return [self._instance(table, row) for row in self.fetchall(table._select_all_sql)]
 
-        return result
+        return self._select(table, select_related=select_related, prefetch_related=prefetch_related)
 
     def get_user(self, table, field_name=None, value=None, return_fields=None):
         if field_name is None and value is None:
@@ -44,94 +165,389 @@ class Database:
         sql = table._get_select_by_user_sql(field_name=field_name, return_fields=return_fields)
         params = (value,)
 
-        cursor = self.conn.execute(sql, params)
-        row = cursor.fetchone()
+        with self.lock:
+            cursor = self.execute(sql, params)
+            row = cursor.fetchone()
         columns = [desc[0] for desc in cursor.description]
 
         return dict(zip(columns, row))
 
-    def get_by_field(self, table, field_name=None, value=None):
+    def get_by_field(self, table, field_name=None, value=None, select_related=(), prefetch_related=()):
+        if field_name is None or value is None:
+            raise ValueError("Either 'field_name' and 'value' must be provided.")
+
+        instances = self._select(
+            table, (field_name, "LIKE"), (f"%{value}%",), select_related, prefetch_related, limit=1
+        )
+        if not instances:
+            raise Exception(f"{table.__name__} instance not found")
 
-        if field_name is not None and value is not None:
-            sql, fields = table._get_select_by_field_sql(field_name=field_name, value=value)
-            params = (f"%{value}%",)
+        return instances[0]
+
+    def get(self, table, id, select_related=(), prefetch_related=()):
+        if not select_related and not prefetch_related:
+            # the common case, lazy foreign key loads included, runs the prebuilt statement
+            row = self.fetchone(table._select_by_id_sql, (id,))
+            instances = [] if row is None else [self._instance(table, row)]
         else:
-            raise ValueError("Either 'field_name' and 'value' must be provided.")
+            instances = self._select(table, ("id", "="), (id,), select_related, prefetch_related)
+        if not instances:
+            raise Exception(f"{table.__name__} instance with {id} does not exist")
 
-        row = self.conn.execute(sql, params).fetchone()
+        return instances[0]
 
-        if row is None:
-            raise Exception(f"{table.__name__} instance not found")
+    def _select(self, table, where=None, params=(), select_related=(), prefetch_related=(), limit=None):
+        """
+        Loads ``table`` rows as instances.
 
-        instance = table()
+        Foreign keys listed in ``select_related`` are fetched in the same query
+        through LEFT JOINs, those in ``prefetch_related`` with one ``IN`` query
+        per related table. Any other foreign key is loaded lazily, on first access.
+        """
+        prefetch = related_tree(prefetch_related)
 
-        for field, value in zip(fields, row):
-            if field.endswith("_id"):
-                field = field[:-3]
-                fk = getattr(table, field)
-                value = self.get(fk.table, id=value)
+        if select_related:
+            sql, plan = join_plan(table, select_related)
+            overlap = set(prefetch) & set(plan[1])
+            if overlap:
+                raise ValueError(f"{', '.join(sorted(overlap))} cannot be both joined and prefetched")
+            prefix = "t0."
+        else:
+            sql, plan = table._select_sql, None
+            prefix = ""
 
-            setattr(instance, field, value)
+        rows = self.fetchall(select_sql(sql, prefix, where, limit), params)
 
-        return instance
+        if plan is None:
+            loaded = [(self._instance(table, row, dict.fromkeys(prefetch)), row) for row in rows]
+        else:
+            width = len(table._select_fields)
+            loaded = [(self._hydrate(plan, row, 0, prefetch)[0], row[:width]) for row in rows]
 
-    def get(self, table, id):
-        sql, fields = table._get_select_by_id_sql(id=id)
-        row = self.conn.execute(sql).fetchone()
+        if prefetch:
+            self._prefetch(table, loaded, prefetch)
 
-        if row is None:
-            raise Exception(f"{table.__name__} instance with {id} does not exist")
+        return [instance for instance, _ in loaded]
 
+    def _instance(self, table, row, related=None):
         instance = table()
-        for field, value in zip(fields, row):
-            if field.endswith("_id"):
-                field = field[:-3]
-                fk = getattr(table, field)
-                value = self.get(fk.table, id=value)
-            setattr(instance, field, value)
+        instance._db = self
+        instance.id = row[0]
+
+        for (name, col), value in zip(table._columns, row[1:]):
+            if isinstance(col, ForeignKey):
+                # only the id is kept, the related row is loaded on first access
+                col.set_id(instance, value)
+                if related is not None and name in related:
+                    col.cache(instance, related[name])
+            else:
+                setattr(instance, name, value)
 
         return instance
 
+    def _hydrate(self, plan, row, offset, deferred=()):
+        table, children = plan
+        width = len(table._select_fields)
+        values = row[offset:offset + width]
+        offset += width
+
+        related = dict.fromkeys(deferred)
+        for name, child in children.items():
+            related[name], offset = self._hydrate(child, row, offset)
+
+        # a LEFT JOIN without a match yields a row of NULLs
+        if values[0] is None:
+            return None, offset
+
+        return self._instance(table, values, related), offset
+
+    def _prefetch(self, table, loaded, tree):
+        for name, subtree in tree.items():
+            fk = foreign_key(table, name)
+            related_table = fk.table
+            index = table._fields.index(f"{name}_id") + 1
+
+            ids = sorted({row[index] for _, row in loaded if row[index] is not None})
+            rows = []
+            for batch in batched(ids, IN_BATCH_SIZE):
+                placeholders = ", ".join("?" * len(batch))
+                rows.extend(self.fetchall(f"{related_table._select_sql} WHERE id IN ({placeholders})", batch))
+
+            related = [(self._instance(related_table, row, dict.fromkeys(subtree)), row) for row in rows]
+            if subtree:
+                self._prefetch(related_table, related, subtree)
+
+            by_id = {instance.id: instance for instance, _ in related}
+            for instance, row in loaded:
+                fk.cache(instance, by_id.get(row[index]))
+
     def update(self, instance):
         sql, values = instance._get_update_sql()
-        self.conn.execute(sql, values)
-        self.conn.commit()
+        self.execute(sql, values)
 
     def delete(self, table, id):
-        sql = table._get_delete_sql(id)
-        self.conn.execute(sql)
-        self.conn.commit()
+        self.execute(table._delete_sql, (id,))
+
+    def bulk_save(self, instances, batch_size=500):
+        """
+        Inserts ``instances`` with ``executemany`` in a single transaction and
+        assigns their ids.
+        """
+        instances = list(instances)
+        if not instances:
+            return instances
+
+        table = type(instances[0])
+        with self.transaction():
+            for batch in batched(instances, batch_size):
+                self.executemany(table._insert_sql, [instance._get_values() for instance in batch])
+                # AUTOINCREMENT hands out consecutive ids while this transaction holds the write lock
+                first_id = self.fetchone("SELECT last_insert_rowid()")[0] - len(batch) + 1
+                for offset, instance in enumerate(batch):
+                    instance._data["id"] = first_id + offset
+
+        return instances
+
+    def bulk_update(self, instances, fields=None, batch_size=500):
+        """
+        Writes ``fields`` (all columns by default) of ``instances`` back with
+        one ``executemany`` per batch, in a single transaction.
+        """
+        instances = list(instances)
+        if not instances:
+            return 0
+
+        table = type(instances[0])
+        columns = dict(table._columns)
+        if fields is None:
+            fields = list(columns)
+        unknown = [field for field in fields if field not in columns]
+        if unknown:
+            raise ValueError(f"{table.__name__} has no column {', '.join(unknown)}")
+
+        assignments = ", ".join(
+            f"{field} = ?" if isinstance(columns[field], Column) else f"{field}_id = ?" for field in fields
+        )
+        sql = f"UPDATE {table._table_name} SET {assignments} WHERE id = ?;"
+
+        def values(instance):
+            row = [
+                getattr(instance, field) if isinstance(columns[field], Column) else columns[field].related_id(instance)
+                for field in fields
+            ]
+            row.append(instance.id)
+            return row
+
+        updated = 0
+        with self.transaction():
+            for batch in batched(instances, batch_size):
+                updated += self.executemany(sql, [values(instance) for instance in batch]).rowcount
+
+        return updated
+
+    def delete_many(self, table, ids, batch_size=IN_BATCH_SIZE):
+        """
+        Deletes the rows with the given ids using ``WHERE id IN (...)``, in a
+        single transaction.
+        """
+        ids = list(ids)
+        deleted = 0
+        with self.transaction():
+            for batch in batched(ids, min(batch_size, IN_BATCH_SIZE)):
+                placeholders = ", ".join("?" * len(batch))
+                deleted += self.execute(
+                    f"DELETE FROM {table._table_name} WHERE id IN ({placeholders});", batch
+                ).rowcount
+
+        return deleted
+
+    def delete_where(self, table, **filters):
+        """
+        Deletes every row matching all ``filters`` with a single statement.
+        Foreign keys may be filtered by instance or by ``<name>_id``.
+        """
+        if not filters:
+            raise ValueError("delete_where needs at least one filter, use delete_many to delete by id")
+
+        columns = dict(table._columns)
+        conditions = []
+        params = []
+        for field, value in filters.items():
+            if isinstance(columns.get(field), ForeignKey):
+                field = f"{field}_id"
+                value = value.id if isinstance(value, Table) else value
+            elif field != "id" and field not in table._fields:
+                raise ValueError(f"{table.__name__} has no column {field}")
+
+            if value is None:
+                conditions.append(f"{field} IS NULL")
+            else:
+                conditions.append(f"{field} = ?")
+                params.append(value)
+
+        return self.execute(f"DELETE FROM {table._table_name} WHERE {' AND '.join(conditions)};", params).rowcount
+
+
+_join_plans = {}
+
+_select_statements = {}
+
+
+def select_sql(sql, prefix, where, limit):
+    """
+    Adds the ``WHERE``/``LIMIT`` clauses to a select, caching the statement
+    per base query, ``(field, operator)`` and limit.
+    """
+    key = (sql, where, limit)
+    statement = _select_statements.get(key)
+    if statement is None:
+        statement = sql
+        if where is not None:
+            statement = f"{statement} WHERE {prefix}{where[0]} {where[1]} ?"
+        if limit is not None:
+            statement = f"{statement} LIMIT {int(limit)}"
+        _select_statements[key] = statement
+
+    return statement
+
+
+def related_tree(paths):
+    """
+    Turns ``["author", "author__publisher"]`` into
+    ``{"author": {"publisher": {}}}``.
+    """
+    tree = {}
+    for path in paths:
+        node = tree
+        for name in path.split("__"):
+            node = node.setdefault(name, {})
+
+    return tree
+
+
+def foreign_key(table, name):
+    col = dict(table._columns).get(name)
+    if not isinstance(col, ForeignKey):
+        raise ValueError(f"{table.__name__}.{name} is not a ForeignKey")
+
+    return col
+
+
+def join_plan(table, paths):
+    """
+    Builds, once per table and set of paths, the LEFT JOIN query loading
+    ``table`` together with the related tables of ``paths``. Every table gets
+    its own alias, and the plan mirrors the column order of the query.
+    """
+    key = (table, tuple(sorted(paths)))
+    cached = _join_plans.get(key)
+    if cached is not None:
+        return cached
+
+    columns = []
+    joins = []
+
+    def add(table, alias, tree):
+        columns.extend(f"{alias}.{field}" for field in table._select_fields)
+        children = {}
+        for name, subtree in tree.items():
+            related_table = foreign_key(table, name).table
+            child_alias = f"t{len(joins) + 1}"
+            joins.append(
+                f"LEFT JOIN {related_table._table_name} AS {child_alias} ON {child_alias}.id = {alias}.{name}_id"
+            )
+            children[name] = add(related_table, child_alias, subtree)
+
+        return table, children
+
+    plan = add(table, "t0", related_tree(paths))
+    sql = f"SELECT {', '.join(columns)} FROM {table._table_name} AS t0"
+    if joins:
+        sql = f"{sql} {' '.join(joins)}"
+
+    _join_plans[key] = sql, plan
+    return sql, plan
+
+
+def atomic(db):
+    """
+    Decorator running a sync handler in ``db.transaction()``. ``db`` is a
+    ``Database`` or a callable returning one, such as a per-thread getter.
+    """
+    def decorator(handler):
+        if inspect.iscoroutinefunction(handler):
+            raise TypeError("atomic handlers must be sync, PyLordASGI runs them on its thread pool")
+
+        @functools.wraps(handler)
+        def wrapper(*args, **kwargs):
+            database = db if isinstance(db, Database) else db()
+            with database.transaction():
+                return handler(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
 
 
 class Table:
+    """
+    Base class for models. The columns of a subclass are collected once, when
+    the class is defined, and its parameterized SQL statements are built
+    from them right away.
+    """
+
+    _columns = ()
+    _foreign_keys = frozenset()
+    _fields = []
+    _attributes = ["id"]
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+
+        cls._columns = tuple(
+            (name, col) for name, col in inspect.getmembers(cls) if isinstance(col, (Column, ForeignKey))
+        )
+        cls._foreign_keys = frozenset(name for name, col in cls._columns if isinstance(col, ForeignKey))
+        # column names as stored in sqlite, foreign keys hold the referenced id
+        cls._fields = [name if isinstance(col, Column) else f"{name}_id" for name, col in cls._columns]
+
+        name = cls.__name__.lower()
+        fields = ", ".join(cls._fields)
+        select_fields = ", ".join(["id"] + cls._fields)
+        cls._table_name = name
+        cls._select_fields = ["id"] + cls._fields
+        cls._attributes = ["id"] + [column for column, _ in cls._columns]
+
+        columns = ["id INTEGER PRIMARY KEY AUTOINCREMENT"] + [
+            f"{column} {col.sql_type}" if isinstance(col, Column) else f"{column}_id INTEGER"
+            for column, col in cls._columns
+        ]
+        cls._create_sql = f"CREATE TABLE IF NOT EXISTS {name} ({', '.join(columns)});"
+        cls._insert_sql = f"INSERT INTO {name} ({fields}) VALUES ({', '.join('?' * len(cls._fields))});"
+        cls._select_sql = f"SELECT {select_fields} FROM {name}"
+        cls._select_all_sql = f"{cls._select_sql};"
+        cls._select_by_id_sql = f"SELECT {select_fields} FROM {name} WHERE id = ?;"
+        cls._update_sql = f"UPDATE {name} SET {', '.join(f'{field} = ?' for field in cls._fields)} WHERE id = ?;"
+        cls._delete_sql = f"DELETE FROM {name} WHERE id = ?;"
+
     def __init__(self, **kwargs):
         self._data = {
             "id": None
 
         }
 
+        for name in self._foreign_keys:
+            self.__dict__[f"{name}_id"] = None
+
         for key, value in kwargs.items():
-            self._data[key] = value
+            if key in self._foreign_keys or (key.endswith("_id") and key[:-3] in self._foreign_keys):
+                setattr(self, key, value)
+            else:
+                self._data[key] = value
 
     @classmethod
     def _get_create_sql(cls):
-        CREATE_TABLE_SQL = "CREATE TABLE IF NOT EXISTS {name} ({fields});"
-        fields = [
-            "id INTEGER PRIMARY KEY AUTOINCREMENT"
-
-        ]
-
-        for name, col in inspect.getmembers(cls):
-            if isinstance(col, Column):
-                fields.append(f"{name} {col.sql_type}")
-
-            elif isinstance(col, ForeignKey):
-                fields.append(f"{name}_id INTEGER")
-
-        fields = ', '.join(fields)
-        name = cls.__name__.lower()
-
-        return CREATE_TABLE_SQL.format(name=name, fields=fields)
+        return cls._create_sql
 
     def __getattribute__(self, attr_name):
         _data = super().__getattribute__("_data")
@@ -146,76 +562,40 @@ class Table:
         super().__setattr__(name, value)
         if name in self._data:
             self._data[name] = value
+        elif name.endswith("_id") and name[:-3] in self._foreign_keys:
+            # a raw id replaces the related instance that was loaded or assigned before
+            self.__dict__.pop(name[:-3], None)
 
-    def _get_insert_sql(self):
-        INSERT_SQL = "INSERT INTO {name} ({fields}) VALUES ({placeholders});"
-        cls = self.__class__
-        fields = []
-        placeholders = []
+    def _get_values(self):
         values = []
-
-        for name, col in inspect.getmembers(cls):
-            if isinstance(col, Column):
-                fields.append(name)
+        for name, col in self._columns:
+            if isinstance(col, ForeignKey):
+                values.append(col.related_id(self))
+            else:
                 values.append(getattr(self, name))
-                placeholders.append("?")
-            elif isinstance(col, ForeignKey):
-                fields.append(f"{name}_id")
-                values.append(getattr(self, name).id)
-                placeholders.append("?")
-
-        fields = ", ".join(fields)
-        placeholders = ", ".join(placeholders)
 
-        sql = INSERT_SQL.format(name=cls.__name__.lower(), fields=fields, placeholders=placeholders)
+        return values
 
-        return sql, values
+    def _get_insert_sql(self):
+        return self._insert_sql, self._get_values()
 
     @classmethod
     def _get_select_all_sql(cls):
-        SELECT_ALL_SQL = "SELECT {fields} FROM {name};"
-
-        fields = ["id"]
-
-        for name, col in inspect.getmembers(cls):
-            if isinstance(col, Column):
-                fields.append(name)
-            elif isinstance(col, ForeignKey):
-                fields.append(f"{name}_id")
-        sql = SELECT_ALL_SQL.format(name=cls.__name__.lower(), fields=", ".join(fields))
-
-        return sql, fields
+        return cls._select_all_sql, cls._select_fields
 
     @classmethod
     def _get_select_by_id_sql(cls, id):
-        SELECT_GET_SQL = "SELECT {fields} FROM {name} WHERE id = {id};"
-        fields = ["id"]
-
-        for name, col in inspect.getmembers(cls):
-            if isinstance(col, Column):
-                fields.append(name)
-            elif isinstance(col, ForeignKey):
-                fields.append(f"{name}_id")
-
-        sql = SELECT_GET_SQL.format(name=cls.__name__.lower(), fields=", ".join(fields), id=id)
-
-        return sql, fields
+        return cls._select_by_id_sql.replace("?", str(int(id))), cls._select_fields
 
     @classmethod
     def _get_select_by_field_sql(cls, field_name, value):
         SELECT_GET_SQL_BY_FIELD = "SELECT {fields} FROM {name} WHERE {field_name} LIKE ?;"
 
-        fields = ["id"]
-
-        for name, col in inspect.getmembers(cls):
-            if isinstance(col, Column):
-                fields.append(name)
-            elif isinstance(col, ForeignKey):
-                fields.append(f"{name}_id")
-
-        sql = SELECT_GET_SQL_BY_FIELD.format(name=cls.__name__.lower(), fields=", ".join(fields), field_name=field_name)
+        sql = SELECT_GET_SQL_BY_FIELD.format(
+            name=cls._table_name, fields=", ".join(cls._select_fields), field_name=field_name
+        )
 
-        return sql, fields
+        return sql, cls._select_fields
 
     @classmethod
     def _get_select_by_user_sql(cls, field_name, return_fields=None):
@@ -224,34 +604,18 @@ class Table:
         else:
             fields_str = ", ".join(return_fields)
 
-        query = f"SELECT {fields_str} FROM {cls.__name__.lower()} WHERE {field_name} = ?"
+        query = f"SELECT {fields_str} FROM {cls._table_name} WHERE {field_name} = ?"
         return query
 
     def _get_update_sql(self):
-        fields = []
-        values = []
-
-        for name, col in inspect.getmembers(self.__class__):
-            if isinstance(col, Column):
-                fields.append(name)
-                values.append(getattr(self, name))
-            elif isinstance(col, ForeignKey):
-                fk = getattr(self, name)
-                fields.append(f"{name}_id")
-                values.append(fk.id if fk else None)
-
-        sql = f"UPDATE {self.__class__.__name__.lower()} SET {', '.join([f'{field} = ?' for field in fields])} WHERE id = ?;"
+        values = self._get_values()
         values.append(self.id)
 
-        return sql, values
+        return self._update_sql, values
 
     @classmethod
     def _get_delete_sql(cls, id):
-        DELETE_SQL = "DELETE FROM {name} WHERE id = {id};"
-
-        sql = DELETE_SQL.format(name=cls.__name__.lower(), id=id)
-
-        return sql
+        return cls._delete_sql.replace("?", str(int(id)))
 
 
 class Column:
@@ -272,5 +636,55 @@ class Column:
 
 
 class ForeignKey:
+    """
+    Reference to a row of ``table``.
+
+    Instances only store the raw id, readable as ``<name>_id`` without a
+    query. The related row is fetched on first access and cached on the
+    instance.
+    """
+
     def __init__(self, table):
         self.table = table
+        self.name = None
+        self.id_attr = None
+
+    def __set_name__(self, owner, name):
+        self.name = name
+        self.id_attr = f"{name}_id"
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+
+        state = instance.__dict__
+        if self.name in state:
+            return state[self.name]
+
+        related_id = state.get(self.id_attr)
+        db = state.get("_db")
+        if related_id is None or db is None:
+            return None
+
+        related = state[self.name] = db.get(self.table, id=related_id)
+        return related
+
+    def __set__(self, instance, value):
+        instance.__dict__[self.name] = value
+        instance.__dict__[self.id_attr] = value.id if value is not None else None
+
+    def set_id(self, instance, related_id):
+        instance.__dict__[self.id_attr] = related_id
+        instance.__dict__.pop(self.name, None)
+
+    def cache(self, instance, related):
+        instance.__dict__[self.name] = related
+
+    def related_id(self, instance):
+        state = instance.__dict__
+        if self.name in state:
+            # the related instance may have been saved since it was assigned
+            related = state[self.name]
+            state[self.id_attr] = related.id if related is not None else None
+
+        return state.get(self.id_attr)
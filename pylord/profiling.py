@@ -0,0 +1,240 @@
+import cProfile
+import contextvars
+import marshal
+import os
+import pstats
+import random
+import threading
+from .metrics import UNMATCHED_ROUTE
+
+
+# profiles of the request being handled, sync handlers that run on worker threads add theirs
+request_profiles = contextvars.ContextVar("pylord_request_profiles", default=None)
+
+
+class Profiler:
+    """
+    Profiles a sample of requests with cProfile and aggregates the results per
+    route template.
+
+    A request is profiled when it carries ``header`` or, otherwise, with
+    probability ``sample_rate``. Only one request per thread is profiled at a
+    time, as cProfile cannot nest.
+    """
+
+    def __init__(self, sample_rate=0.0, header="X-Profile"):
+        self.sample_rate = sample_rate
+        self.header = header
+        self.stats = {}
+        self.counts = {}
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def should_profile(self, headers):
+        if getattr(self.local, "active", False):
+            return False
+        if self.header is not None and self.header in headers:
+            return True
+
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def start(self):
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # another profiler is already attached to this thread
+            return None
+
+        self.local.active = True
+        return profile
+
+    def stop(self, profile, route):
+        profile.disable()
+        self.local.active = False
+        self.record(route, [profile])
+
+    def record(self, route, profiles):
+        with self.lock:
+            stats = self.stats.get(route)
+            for profile in profiles:
+                if not profile.getstats():
+                    continue
+                if stats is None:
+                    stats = self.stats[route] = pstats.Stats(profile)
+                else:
+                    stats.add(profile)
+            self.counts[route] = self.counts.get(route, 0) + 1
+
+    @staticmethod
+    def call(function, args, kwargs):
+        """
+        Runs ``function`` on a worker thread, under its own cProfile when the
+        request that handed it over is being profiled.
+        """
+        profiles = request_profiles.get()
+        if profiles is None:
+            return function(*args, **kwargs)
+
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            return function(*args, **kwargs)
+
+        try:
+            return function(*args, **kwargs)
+        finally:
+            profile.disable()
+            profiles.append(profile)
+
+    def routes(self):
+        with self.lock:
+            return dict(self.counts)
+
+    def reset(self, route=None):
+        with self.lock:
+            if route is None:
+                self.stats.clear()
+                self.counts.clear()
+            else:
+                self.stats.pop(route, None)
+                self.counts.pop(route, None)
+
+    def dump_stats(self, route, path):
+        with self.lock:
+            self.stats[route].dump_stats(path)
+
+    def pstats_bytes(self, route):
+        with self.lock:
+            return marshal.dumps(self.stats[route].stats)
+
+    def collapsed(self, route):
+        """
+        Renders the route's profile as collapsed stacks for flamegraph tools.
+
+        cProfile only keeps caller -> callee edges, so each function's own time
+        is attributed to the stack built by following its heaviest caller.
+        """
+        with self.lock:
+            stats = dict(self.stats[route].stats)
+
+        lines = []
+        for function, (_, _, own_time, _, _) in stats.items():
+            microseconds = int(own_time * 1_000_000)
+            if microseconds <= 0:
+                continue
+
+            stack = [function]
+            seen = {function}
+            while True:
+                callers = stats.get(stack[-1], (0, 0, 0, 0, {}))[4]
+                candidates = [caller for caller in callers if caller not in seen]
+                if not candidates:
+                    break
+                # weigh each caller by the time spent in this call edge, not by its own total
+                caller = max(candidates, key=lambda item: callers[item][3])
+                stack.append(caller)
+                seen.add(caller)
+
+            frames = ";".join(frame_name(frame) for frame in reversed(stack))
+            lines.append(f"{frames} {microseconds}")
+
+        return "\n".join(sorted(lines)) + "\n"
+
+
+def frame_name(function):
+    filename, lineno, name = function
+    return f"{os.path.basename(filename)}:{lineno}:{name}".replace(";", ":").replace(" ", "_")
+
+
+def profiled(profiler, handle_request, route_store):
+    def handle_profiled_request(request):
+        if not profiler.should_profile(request.headers):
+            return handle_request(request)
+
+        profile = profiler.start()
+        if profile is None:
+            return handle_request(request)
+
+        try:
+            return handle_request(request)
+        finally:
+            profiler.stop(profile, route_store(request).get("pylord.route", UNMATCHED_ROUTE))
+
+    return handle_profiled_request
+
+
+class ProfiledCoroutine:
+    """
+    Awaits ``coroutine`` with ``profile`` enabled only while the coroutine
+    itself runs, so work of other tasks interleaved at its awaits is not
+    charged to it.
+    """
+
+    def __init__(self, coroutine, profile):
+        self.coroutine = coroutine
+        self.profile = profile
+
+    def __await__(self):
+        coroutine, profile = self.coroutine, self.profile
+        value, error = None, None
+
+        while True:
+            profile.enable()
+            try:
+                step = coroutine.send(value) if error is None else coroutine.throw(error)
+            except StopIteration as stop:
+                return stop.value
+            finally:
+                profile.disable()
+
+            try:
+                value, error = (yield step), None
+            except GeneratorExit:
+                coroutine.close()
+                raise
+            except BaseException as e:
+                value, error = None, e
+
+
+def profiled_async(profiler, handle_request, route_store):
+    async def handle_profiled_request(request):
+        if not profiler.should_profile(request.headers):
+            return await handle_request(request)
+
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+            profile.disable()
+        except ValueError:
+            # another profiler is already attached to this thread
+            return await handle_request(request)
+
+        profiles = [profile]
+        token = request_profiles.set(profiles)
+        try:
+            return await ProfiledCoroutine(handle_request(request), profile)
+        finally:
+            request_profiles.reset(token)
+            profiler.record(route_store(request).get("pylord.route", UNMATCHED_ROUTE), profiles)
+
+    return handle_profiled_request
+
+
+def profile_report(profiler, response, route=None, format=None):
+    if route is None:
+        response.json = profiler.routes()
+        return
+
+    if route not in profiler.stats:
+        response.status_code = 404
+        response.json = {"error": f"No profile recorded for {route}"}
+        return
+
+    if format == "pstats":
+        response.content_type = "application/octet-stream"
+        response.headers["Content-Disposition"] = 'attachment; filename="profile.pstats"'
+        return profiler.pstats_bytes(route)
+
+    response.text = profiler.collapsed(route)
@@ -0,0 +1,10 @@
+from webob import Request as WebRequest
+from .serializers import default_serializer
+
+
+class Request(WebRequest):
+
+    @property
+    def json(self):
+        serializer = self.environ.get("pylord.serializer", default_serializer)
+        return serializer.loads(self.body)
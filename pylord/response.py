@@ -1,21 +1,48 @@
 from webob import Response as WebResponse
-import json
+from http import HTTPStatus
+from .headers import Headers
+from .serializers import default_serializer
+
+
+STATUS_LINES = {status.value: f"{status.value} {status.phrase}" for status in HTTPStatus}
+
+CHARSET_TYPES = ("application/xml", "application/javascript")
+
+DEFAULT_CONTENT_TYPE = "text/html; charset=UTF-8"
+
+_content_type_headers = {}
+
+
+def content_type_header(content_type):
+    header = _content_type_headers.get(content_type)
+    if header is None:
+        header = content_type
+        if "charset=" not in content_type and (content_type.startswith("text/") or content_type in CHARSET_TYPES):
+            header = f"{content_type}; charset=UTF-8"
+        _content_type_headers[content_type] = header
+
+    return header
 
 
 class Response:
+    __slots__ = ("html", "json", "body", "text", "content_type", "status_code", "headers", "stream",
+                 "serializer")
 
-    def __init__(self):
+    def __init__(self, serializer=default_serializer):
         self.html = None
         self.json = None
         self.body = b''
         self.text = None
         self.content_type = None
         self.status_code = 200
+        self.headers = Headers()
+        self.stream = None
+        self.serializer = serializer
 
     def set_body_and_content_type(self):
         if self.json is not None:
-            self.body = json.dumps(self.json).encode()
-            self.content_type = "application/json"
+            self.body = self.serializer.dumps(self.json)
+            self.content_type = self.serializer.content_type
 
         if self.html is not None:
             self.body = self.html.encode()
@@ -25,11 +52,94 @@ class Response:
             self.body = self.text
             self.content_type = "text/plain"
 
+    def render(self):
+        self.set_body_and_content_type()
+        self.json = self.html = self.text = None
+
+        if isinstance(self.body, str):
+            self.body = self.body.encode()
+
+        return self.body
+
+    def add_header(self, name, value):
+        current = self.headers.get(name)
+        if current is None:
+            self.headers[name] = value
+        elif isinstance(current, list):
+            current.append(value)
+        else:
+            self.headers[name] = [current, value]
+
+    def header_list(self, *defaults):
+        headers = list(defaults)
+        if self.headers:
+            names = {name.lower() for name in self.headers}
+            headers = [header for header in headers if header[0].lower() not in names]
+
+            for name, value in self.headers.items():
+                if isinstance(value, list):
+                    headers.extend((name, item) for item in value)
+                else:
+                    headers.append((name, value))
+
+        return headers
+
     def __call__(self, environ, start_response):
+        if self.stream is not None:
+            return self.stream_response(environ, start_response)
+
         self.set_body_and_content_type()
 
+        status = STATUS_LINES.get(self.status_code)
+        if status is None:
+            return self.wrapper_response(environ, start_response)
+
+        body = self.body
+        if isinstance(body, str):
+            body = body.encode()
+
+        content_type = DEFAULT_CONTENT_TYPE if self.content_type is None else content_type_header(self.content_type)
+        if self.status_code < 200 or self.status_code in (204, 304):
+            start_response(status, self.header_list())
+            return []
+
+        start_response(
+            status, self.header_list(("Content-Type", content_type), ("Content-Length", str(len(body))))
+        )
+
+        if environ["REQUEST_METHOD"] == "HEAD":
+            return []
+
+        return [body]
+
+    def wrapper_response(self, environ, start_response):
         response = WebResponse(
             body=self.body, content_type=self.content_type, status=self.status_code
         )
+        for name in self.headers:
+            response.headers.pop(name, None)
+        response.headerlist.extend(self.header_list())
 
         return response(environ, start_response)
+
+    def stream_response(self, environ, start_response):
+        content_type = content_type_header(self.content_type or "application/octet-stream")
+        status = STATUS_LINES.get(self.status_code, f"{self.status_code} Unknown Status")
+        start_response(status, self.header_list(("Content-Type", content_type)))
+
+        return iter_chunks(self.stream)
+
+
+def iter_chunks(stream):
+    # the WSGI server calls close() on the returned iterable when the client goes
+    # away, which has to reach the handler's generator so it can release resources
+    try:
+        for chunk in stream:
+            if isinstance(chunk, str):
+                chunk = chunk.encode()
+            if chunk:
+                yield chunk
+    finally:
+        close = getattr(stream, "close", None)
+        if close is not None:
+            close()
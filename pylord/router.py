@@ -0,0 +1,124 @@
+import inspect
+from parse import compile as compile_pattern
+
+
+class Node:
+    __slots__ = ("static", "dynamic", "handler_data")
+
+    def __init__(self):
+        self.static = {}
+        self.dynamic = []
+        self.handler_data = None
+
+
+class Router:
+    """
+    Compiled route table.
+
+    Static paths are resolved with a single dict lookup. Parameterized paths
+    live in a segment trie where every segment holding a ``{name:format}``
+    field is compiled once, when the route is added. Literal segments win
+    over parameterized ones, and parameters never span a ``/``.
+    """
+
+    def __init__(self):
+        self.static_routes = {}
+        self.root = Node()
+
+    def add(self, path, handler_data):
+        if "{" not in path:
+            self.static_routes[path] = handler_data
+            return
+
+        node = self.root
+        for segment in path.split("/"):
+            if "{" in segment:
+                node = self._dynamic_child(node, segment)
+            else:
+                node = node.static.setdefault(segment, Node())
+
+        node.handler_data = handler_data
+
+    def match(self, path):
+        handler_data = self.static_routes.get(path)
+        if handler_data is not None:
+            return handler_data, {}
+
+        kwargs = {}
+        handler_data = self._match(self.root, path.split("/"), 0, kwargs)
+        if handler_data is None:
+            return None, None
+
+        return handler_data, kwargs
+
+    @staticmethod
+    def _dynamic_child(node, segment):
+        for pattern, parser, child in node.dynamic:
+            if pattern == segment:
+                return child
+
+        child = Node()
+        node.dynamic.append((segment, compile_pattern(segment, case_sensitive=True), child))
+        return child
+
+    def _match(self, node, segments, index, kwargs):
+        if index == len(segments):
+            return node.handler_data
+
+        segment = segments[index]
+
+        child = node.static.get(segment)
+        if child is not None:
+            handler_data = self._match(child, segments, index + 1, kwargs)
+            if handler_data is not None:
+                return handler_data
+
+        for pattern, parser, child in node.dynamic:
+            result = parser.parse(segment)
+            if result is None:
+                continue
+
+            handler_data = self._match(child, segments, index + 1, kwargs)
+            if handler_data is not None:
+                kwargs.update(result.named)
+                return handler_data
+
+        return None
+
+
+HTTP_METHODS = ["post", "put", "patch", "options", "delete", "get", "head", "connect", "trace"]
+
+
+def build_dispatch(handler, allowed_methods, singleton=False):
+    """
+    Precompute the method -> callable table of a route.
+
+    Class-based handlers are instantiated per request unless ``singleton`` is
+    set, in which case a single instance is created here and reused.
+    """
+    if not inspect.isclass(handler):
+        return {method.lower(): handler for method in allowed_methods}
+
+    if singleton:
+        view = handler()
+        return {
+            method: getattr(view, method) for method in HTTP_METHODS if callable(getattr(view, method, None))
+        }
+
+    dispatch = {}
+    for method in HTTP_METHODS:
+        if callable(getattr(handler, method, None)):
+            dispatch[method] = _per_request_view(handler, method)
+
+    return dispatch
+
+
+def allow_header(dispatch):
+    return ", ".join(method.upper() for method in dispatch)
+
+
+def _per_request_view(view_cls, method):
+    def call(request, response, **kwargs):
+        return getattr(view_cls(), method)(request, response, **kwargs)
+
+    return call
@@ -0,0 +1,98 @@
+import dataclasses
+import datetime
+import decimal
+import json
+import uuid
+from .orm import Table, Column, ForeignKey
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def table_to_dict(instance):
+    data = {"id": instance.id}
+    for name, col in type(instance)._columns:
+        if isinstance(col, ForeignKey):
+            # serializing must not run a lazy query per row, related rows are
+            # only included when they are already loaded
+            data[col.id_attr] = col.related_id(instance)
+            if name in instance.__dict__:
+                data[name] = instance.__dict__[name]
+            continue
+
+        value = getattr(instance, name)
+        data[name] = None if isinstance(value, Column) else value
+
+    return data
+
+
+def default(obj):
+    if isinstance(obj, Table):
+        return table_to_dict(obj)
+
+    if dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+        return dataclasses.asdict(obj)
+
+    if isinstance(obj, (datetime.datetime, datetime.date, datetime.time)):
+        return obj.isoformat()
+
+    if isinstance(obj, (decimal.Decimal, uuid.UUID)):
+        return str(obj)
+
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+class JSONSerializer:
+    """
+    Standard library backed serializer. ``dumps`` always returns bytes so the
+    response can send it as is.
+    """
+
+    content_type = "application/json"
+
+    def __init__(self):
+        # a single encoder instance skips JSONEncoder construction on every call;
+        # with ensure_ascii the output is pure ASCII, so encoding it is a plain copy
+        self.encoder = json.JSONEncoder(default=default, separators=(",", ":"))
+        self.decoder = json.JSONDecoder()
+
+    def dumps(self, obj):
+        return self.encoder.encode(obj).encode("ascii")
+
+    def loads(self, data):
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            data = bytes(data).decode("utf-8")
+        if not data:
+            raise ValueError("Empty JSON body")
+
+        return self.decoder.decode(data)
+
+
+class OrjsonSerializer(JSONSerializer):
+    def __init__(self):
+        super().__init__()
+        self.options = orjson.OPT_NON_STR_KEYS
+
+    def dumps(self, obj):
+        return orjson.dumps(obj, default=default, option=self.options)
+
+    def loads(self, data):
+        if not data:
+            raise ValueError("Empty JSON body")
+
+        return orjson.loads(data)
+
+
+def get_serializer():
+    if orjson is not None:
+        return OrjsonSerializer()
+
+    return JSONSerializer()
+
+
+default_serializer = get_serializer()
@@ -0,0 +1,88 @@
+import gzip
+import hashlib
+import json
+import os
+import shutil
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+MANIFEST_NAME = "manifest.json"
+
+INCOMPRESSIBLE_EXTENSIONS = {
+    ".png", ".jpg", ".jpeg", ".gif", ".webp", ".avif", ".ico", ".woff", ".woff2",
+    ".zip", ".gz", ".br", ".bz2", ".xz", ".mp3", ".mp4", ".webm", ".ogg", ".pdf",
+}
+
+
+def fingerprint(path, data):
+    digest = hashlib.md5(data).hexdigest()[:12]
+    base, ext = os.path.splitext(path)
+    return f"{base}.{digest}{ext}"
+
+
+def write_compressed(path, data):
+    with open(f"{path}.gz", "wb") as f:
+        f.write(gzip.compress(data, compresslevel=9, mtime=0))
+
+    if brotli is not None:
+        with open(f"{path}.br", "wb") as f:
+            f.write(brotli.compress(data, quality=11))
+
+
+def collect_static(static_dir, output_dir, compress=True):
+    """
+    Copies every file of ``static_dir`` to ``output_dir`` twice, under its own
+    name and under a content-hashed name, precompresses the copies and writes a
+    manifest mapping original to hashed names.
+    """
+    paths = {}
+
+    for root, _, files in os.walk(static_dir):
+        for name in files:
+            source = os.path.join(root, name)
+            path = os.path.relpath(source, static_dir).replace(os.sep, "/")
+
+            with open(source, "rb") as f:
+                data = f.read()
+
+            hashed_path = fingerprint(path, data)
+            paths[path] = hashed_path
+
+            for target_path in (path, hashed_path):
+                target = os.path.join(output_dir, target_path)
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                shutil.copy2(source, target)
+
+                if compress and os.path.splitext(name)[1].lower() not in INCOMPRESSIBLE_EXTENSIONS:
+                    write_compressed(target, data)
+
+    with open(os.path.join(output_dir, MANIFEST_NAME), "w") as f:
+        json.dump({"paths": paths}, f, indent=2, sort_keys=True)
+
+    return paths
+
+
+def load_manifest(output_dir):
+    try:
+        with open(os.path.join(output_dir, MANIFEST_NAME)) as f:
+            return json.load(f)["paths"]
+    except FileNotFoundError:
+        return {}
+
+
+class StaticURL:
+    def __init__(self, prefix="/static", manifest=None):
+        self.prefix = prefix.rstrip("/")
+        self.manifest = manifest or {}
+        self.hashed_urls = {f"{self.prefix}/{path}" for path in self.manifest.values()}
+
+    def __call__(self, path):
+        path = path.lstrip("/")
+        return f"{self.prefix}/{self.manifest.get(path, path)}"
+
+    def is_immutable(self, url):
+        return url in self.hashed_urls
@@ -0,0 +1,37 @@
+from jinja2 import Environment, FileSystemLoader, FileSystemBytecodeCache
+import os
+
+
+def create_template_env(templates_dir, production=False, cache_size=400, bytecode_cache_dir=None,
+                        enable_async=False):
+    """
+    Builds the Jinja environment of an app.
+
+    In production mode templates are never re-checked on disk and compiled
+    bytecode is shared between workers and restarts through a filesystem cache.
+    """
+    options = {
+        "loader": FileSystemLoader(os.path.abspath(templates_dir)),
+        "cache_size": cache_size,
+        "enable_async": enable_async,
+    }
+
+    if production:
+        if bytecode_cache_dir is not None:
+            os.makedirs(bytecode_cache_dir, exist_ok=True)
+
+        # sync and async environments compile to different code, so they must not share cache files
+        pattern = "__jinja2_async_%s.cache" if enable_async else "__jinja2_%s.cache"
+
+        options["auto_reload"] = False
+        options["bytecode_cache"] = FileSystemBytecodeCache(bytecode_cache_dir, pattern)
+
+    return Environment(**options)
+
+
+def warm_templates(template_env):
+    names = template_env.list_templates()
+    for name in names:
+        template_env.get_template(name)
+
+    return names
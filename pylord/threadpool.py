@@ -0,0 +1,115 @@
+import asyncio
+import contextvars
+import functools
+import inspect
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+def is_async_callable(function):
+    while isinstance(function, functools.partial):
+        function = function.func
+
+    return inspect.iscoroutinefunction(function) or inspect.iscoroutinefunction(getattr(function, "__call__", None))
+
+
+def sync_methods(handler, dispatch):
+    """
+    Returns the methods of a route whose handler is a plain function and so
+    has to run on the thread pool.
+    """
+    if inspect.isclass(handler):
+        return frozenset(method for method in dispatch if not is_async_callable(getattr(handler, method)))
+
+    return frozenset() if is_async_callable(handler) else frozenset(dispatch)
+
+
+class ThreadPool:
+    """
+    Bounded pool running synchronous handlers off the event loop.
+
+    Calls beyond ``max_workers`` wait in the executor queue; the number of
+    queued and running calls is kept so it can be exported as metrics. The
+    caller's context variables are copied into the worker thread. With a
+    ``profiler`` set, calls made for a profiled request are profiled in the
+    worker.
+    """
+
+    def __init__(self, max_workers=40):
+        self.max_workers = max_workers
+        self.executor = None
+        self.lock = threading.Lock()
+        self.queued = 0
+        self.active = 0
+        self.completed = 0
+        self.profiler = None
+
+    def start(self):
+        with self.lock:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix="pylord-worker")
+
+        return self.executor
+
+    def shutdown(self, wait=True):
+        with self.lock:
+            executor, self.executor = self.executor, None
+
+        if executor is not None:
+            executor.shutdown(wait=wait)
+
+    async def run(self, function, *args, **kwargs):
+        executor = self.executor or self.start()
+        context = contextvars.copy_context()
+        # "queued" until a worker picks the call up; a call abandoned while queued never runs
+        state = ["queued"]
+
+        with self.lock:
+            self.queued += 1
+
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                executor, functools.partial(context.run, self._call, state, function, args, kwargs)
+            )
+        finally:
+            with self.lock:
+                if state[0] == "queued":
+                    state[0] = "abandoned"
+                    self.queued -= 1
+                else:
+                    self.completed += 1
+
+    def _call(self, state, function, args, kwargs):
+        with self.lock:
+            if state[0] == "abandoned":
+                return None
+            state[0] = "running"
+            self.queued -= 1
+            self.active += 1
+
+        try:
+            if self.profiler is not None:
+                return self.profiler.call(function, args, kwargs)
+            return function(*args, **kwargs)
+        finally:
+            with self.lock:
+                self.active -= 1
+
+    def collect(self):
+        with self.lock:
+            queued, active, completed = self.queued, self.active, self.completed
+
+        return [
+            "# HELP pylord_threadpool_workers Maximum number of worker threads for sync handlers.",
+            "# TYPE pylord_threadpool_workers gauge",
+            f"pylord_threadpool_workers {self.max_workers}",
+            "# HELP pylord_threadpool_active Sync handler calls currently running.",
+            "# TYPE pylord_threadpool_active gauge",
+            f"pylord_threadpool_active {active}",
+            "# HELP pylord_threadpool_queued Sync handler calls waiting for a worker thread.",
+            "# TYPE pylord_threadpool_queued gauge",
+            f"pylord_threadpool_queued {queued}",
+            "# HELP pylord_threadpool_calls_total Sync handler calls run on the pool.",
+            "# TYPE pylord_threadpool_calls_total counter",
+            f"pylord_threadpool_calls_total {completed}",
+        ]
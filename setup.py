@@ -34,6 +34,8 @@ REQUIRED = [
 # What packages are optional?
 EXTRAS = {
     # 'fancy feature': ['django'],
+    'json': ['orjson'],
+    'brotli': ['brotli'],
 }
 
 # The rest you shouldn't have to touch too much :)
@@ -208,7 +208,525 @@ def test_html_helper(app, test_client):
     assert "Best_body" in response.text
 
 
+def test_typed_parameterized_routes(app, test_client):
+    @app.route("/product/{id:d}")
+    def product(req, resp, id):
+        resp.json = {"id": id}
 
+    assert test_client.get("http://testserver/product/12").json() == {"id": 12}
+    assert test_client.get("http://testserver/product/abc").status_code == 404
 
 
+def test_static_route_wins_over_parameterized_route(app, test_client):
+    @app.route("/hello/{name}")
+    def generating(req, resp, name):
+        resp.text = f"hello {name}"
+
+    @app.route("/hello/world")
+    def world(req, resp):
+        resp.text = "static world"
+
+    assert test_client.get("http://testserver/hello/world").text == "static world"
+    assert test_client.get("http://testserver/hello/kamol").text == "hello kamol"
+    assert test_client.get("http://testserver/hello/kamol/extra").status_code == 404
+
+
+def test_method_not_allowed_sets_allow_header(app, test_client):
+    @app.route("/book")
+    class Books:
+        def get(self, req, resp):
+            resp.text = "all books"
+
+        def post(self, req, resp):
+            resp.text = "book created"
+
+    response = test_client.delete("http://testserver/book")
+
+    assert response.status_code == 405
+    assert response.headers["Allow"] == "POST, GET"
+
+
+def test_singleton_class_based_handler(app, test_client):
+    instances = []
+
+    @app.route("/counter", singleton=True)
+    class Counter:
+        def __init__(self):
+            instances.append(self)
+            self.count = 0
+
+        def get(self, req, resp):
+            self.count += 1
+            resp.text = str(self.count)
+
+    test_client.get("http://testserver/counter")
+
+    assert test_client.get("http://testserver/counter").text == "2"
+    assert len(instances) == 1
+
+
+def test_class_based_static_and_class_methods(app, test_client):
+    @app.route("/static")
+    class Static:
+        greeting = "hello"
+
+        @staticmethod
+        def get(req, resp):
+            resp.text = "static"
+
+        @classmethod
+        def post(cls, req, resp):
+            resp.text = cls.greeting
+
+    assert test_client.get("http://testserver/static").text == "static"
+    assert test_client.post("http://testserver/static").text == "hello"
+
+
+def test_streaming_response(app, test_client):
+    @app.route("/export")
+    def export(req, resp):
+        resp.content_type = "text/csv"
+        resp.stream = (f"{i},row{i}\n" for i in range(3))
+
+    response = test_client.get("http://testserver/export")
+
+    assert response.headers["Content-Type"].startswith("text/csv")
+    assert response.text == "0,row0\n1,row1\n2,row2\n"
+
+
+def test_custom_response_headers(app, test_client):
+    @app.route("/headers")
+    def headers_handler(req, resp):
+        resp.json = {"name": "pylord"}
+        resp.headers["X-Custom"] = "yes"
+        resp.add_header("Set-Cookie", "a=1")
+        resp.add_header("Set-Cookie", "b=2")
+
+    response = test_client.get("http://testserver/headers")
+
+    assert response.headers["X-Custom"] == "yes"
+    assert response.headers["Content-Length"] == str(len(response.content))
+    assert response.cookies["a"] == "1"
+    assert response.cookies["b"] == "2"
+
+
+def test_json_serializer_handles_dataclasses_datetimes_and_tables(app, test_client):
+    import dataclasses
+    import datetime
+    from pylord.orm import Table, Column
+
+    @dataclasses.dataclass
+    class Point:
+        x: int
+        y: int
+
+    class Author(Table):
+        name = Column(str)
+
+    @app.route("/json")
+    def json_handler(req, resp):
+        resp.json = {
+            "point": Point(1, 2),
+            "created": datetime.date(2024, 1, 2),
+            "author": Author(name="kamol"),
+        }
+
+    data = test_client.get("http://testserver/json").json()
+
+    assert data["point"] == {"x": 1, "y": 2}
+    assert data["created"] == "2024-01-02"
+    assert data["author"] == {"id": None, "name": "kamol"}
+
+
+def test_request_json_uses_app_serializer(app, test_client):
+    @app.route("/echo", allowed_methods=["post"])
+    def echo(req, resp):
+        resp.json = req.json
+
+    assert test_client.post("http://testserver/echo", json={"name": "pylord"}).json() == {"name": "pylord"}
+
+
+def test_compression_middleware(app, test_client):
+    import gzip
+    import json
+    from pylord.compression import CompressionMiddleware
+
+    app.add_middleware(CompressionMiddleware)
+
+    @app.route("/big")
+    def big(req, resp):
+        resp.json = {"items": list(range(500))}
+
+    @app.route("/small")
+    def small(req, resp):
+        resp.json = {"items": []}
+
+    response = test_client.get("http://testserver/big", headers={"Accept-Encoding": "gzip"})
+
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.headers["Vary"] == "Accept-Encoding"
+    assert json.loads(gzip.decompress(response.content)) == {"items": list(range(500))}
+
+    response = test_client.get("http://testserver/small", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in response.headers
+
+    response = test_client.get("http://testserver/big", headers={"Accept-Encoding": "identity"})
+    assert "Content-Encoding" not in response.headers
+    assert response.headers["Vary"] == "Accept-Encoding"
+
+
+def test_add_compression_options(app, test_client):
+    import gzip
+
+    app.add_compression(minimum_size=10)
+
+    @app.route("/small")
+    def small(req, resp):
+        resp.json = {"items": [1, 2, 3]}
+
+    response = test_client.get("http://testserver/small", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert gzip.decompress(response.content) == b'{"items":[1,2,3]}'
+
+
+def test_route_response_cache(app, test_client):
+    calls = []
+
+    @app.route("/product/{id:d}", cache=60)
+    def product(req, resp, id):
+        calls.append(id)
+        resp.json = {"id": id, "calls": len(calls)}
+
+    first = test_client.get("http://testserver/product/1").json()
+    second = test_client.get("http://testserver/product/1").json()
+    test_client.get("http://testserver/product/1?page=2")
+
+    assert first == second
+    assert calls == [1, 1]
+
+    cache = app.routes["/product/{id:d}"]["cache"]
+    assert cache.stats["hits"] == 1
+    assert cache.stats["misses"] == 2
+
+    app.invalidate_cache("/product/1")
+    test_client.get("http://testserver/product/1")
+
+    assert calls == [1, 1, 1]
+
+
+@pytest.mark.parametrize("name, value", [
+    ("Set-Cookie", "session=user1"),
+    ("Cache-Control", "private, max-age=60"),
+    ("Cache-Control", "no-store"),
+    ("Cache-Control", "no-cache"),
+    ("Vary", "*"),
+])
+def test_response_cache_skips_per_client_responses(app, test_client, name, value):
+    calls = []
+
+    @app.route("/profile", cache=60)
+    def profile(req, resp):
+        calls.append(1)
+        resp.headers[name] = value
+        resp.text = f"call {len(calls)}"
+
+    test_client.get("http://testserver/profile")
+    second = test_client.get("http://testserver/profile")
+
+    assert second.text == "call 2"
+    assert len(calls) == 2
+
+
+def test_response_cache_evicts_least_recently_used():
+    from pylord.cache import ResponseCache
+
+    cache = ResponseCache(max_size=2)
+    for path in ("/a", "/b", "/c"):
+        cache.set(("GET", path, ""), 200, "text/plain", b"body", {})
+
+    assert cache.get(("GET", "/a", "")) is None
+    assert cache.get(("GET", "/c", "")) is not None
+    assert cache.stats["evictions"] == 1
+
+
+def test_auto_etag_and_conditional_get():
+    from pylord.app import PyLordApp
+
+    app = PyLordApp(auto_etag=True)
+    client = app.test_session()
+
+    @app.route("/json")
+    def json_handler(req, resp):
+        resp.json = {"name": "pylord"}
+
+    response = client.get("http://testserver/json")
+    etag = response.headers["ETag"]
+
+    assert etag.startswith('W/"')
+
+    response = client.get("http://testserver/json", headers={"If-None-Match": etag})
+
+    assert response.status_code == 304
+    assert response.content == b""
+
+
+def test_response_header_names_are_case_insensitive():
+    from pylord.app import PyLordApp
 
+    app = PyLordApp(auto_etag=True)
+    client = app.test_session()
+
+    @app.route("/tagged")
+    def tagged(req, resp):
+        resp.headers["etag"] = '"mine"'
+        resp.text = "tagged"
+
+    response = client.get("http://testserver/tagged")
+    assert response.headers["ETag"] == '"mine"'
+    assert client.get("http://testserver/tagged", headers={"If-None-Match": '"mine"'}).status_code == 304
+
+
+def test_route_etag_skips_handler_when_fresh(app, test_client):
+    calls = []
+
+    @app.route("/product/{id:d}", etag=lambda req, id: f"product-{id}-v3")
+    def product(req, resp, id):
+        calls.append(id)
+        resp.json = {"id": id}
+
+    response = test_client.get("http://testserver/product/1")
+    assert response.headers["ETag"] == '"product-1-v3"'
+
+    response = test_client.get("http://testserver/product/1", headers={"If-None-Match": '"product-1-v3"'})
+
+    assert response.status_code == 304
+    assert calls == [1]
+
+
+def test_route_etag_is_not_sent_with_errors(app, test_client):
+    @app.route("/item/{id:d}", etag=lambda req, id: "v1")
+    def item(req, resp, id):
+        resp.status_code = 404
+        resp.text = "gone"
+
+    response = test_client.get("http://testserver/item/1")
+    assert response.status_code == 404
+    assert "ETag" not in response.headers
+
+
+def test_production_templates_are_warmed_with_bytecode_cache(tmp_path):
+    from pylord.app import PyLordApp
+
+    templates_dir = tmp_path / "templates"
+    templates_dir.mkdir()
+    (templates_dir / "page.html").write_text("<h1>{{ title }}</h1>")
+    bytecode_dir = tmp_path / "bytecode"
+
+    app = PyLordApp(
+        templates_dir=str(templates_dir), production=True, template_bytecode_dir=str(bytecode_dir)
+    )
+
+    assert app.warm_templates() == ["page.html"]
+    assert app.template_env.auto_reload is False
+    assert len(list(bytecode_dir.iterdir())) == 1
+    assert app.template("page.html", context={"title": "hi"}) == "<h1>hi</h1>"
+
+
+def test_collect_static_and_production_static_files(tmp_path):
+    from pylord.app import PyLordApp
+    from pylord.static import collect_static
+
+    static_dir = tmp_path / "static"
+    (static_dir / "css").mkdir(parents=True)
+    (static_dir / "css" / "main.css").write_text("body {background-color: lightblue;}" * 20)
+    static_root = tmp_path / "collected"
+
+    manifest = collect_static(str(static_dir), str(static_root))
+    hashed = manifest["css/main.css"]
+
+    assert hashed.startswith("css/main.") and hashed.endswith(".css")
+    assert (static_root / f"{hashed}.gz").exists()
+
+    app = PyLordApp(static_dir=str(static_dir), static_root=str(static_root), production=True)
+    client = app.test_session()
+
+    assert app.static_url("css/main.css") == f"/static/{hashed}"
+
+    response = client.get(f"http://testserver/static/{hashed}", headers={"Accept-Encoding": "gzip"})
+
+    assert response.status_code == 200
+    assert "immutable" in response.headers["Cache-Control"]
+    assert response.headers["Content-Encoding"] == "gzip"
+
+
+def test_middleware_order_and_short_circuit(app, test_client):
+    from pylord.response import Response
+
+    calls = []
+
+    class Outer(Middleware):
+        def process_request(self, req):
+            calls.append("outer request")
+
+        def process_response(self, req, resp):
+            calls.append("outer response")
+
+    class Auth(Middleware):
+        def process_request(self, req):
+            calls.append("auth request")
+            if "Authorization" not in req.headers:
+                response = Response()
+                response.status_code = 401
+                response.text = "Unauthorized"
+                return response
+
+    class Inner(Middleware):
+        def process_response(self, req, resp):
+            calls.append("inner response")
+
+    app.add_middleware(Inner)
+    app.add_middleware(Auth)
+    app.add_middleware(Outer)
+
+    @app.route("/home")
+    def home(req, resp):
+        calls.append("handler")
+        resp.text = "from handler"
+
+    response = test_client.get("http://testserver/home")
+
+    assert response.status_code == 401
+    assert calls == ["outer request", "auth request", "outer response"]
+
+    calls.clear()
+    response = test_client.get("http://testserver/home", headers={"Authorization": "Bearer token"})
+
+    assert response.text == "from handler"
+    assert calls == ["outer request", "auth request", "handler", "inner response", "outer response"]
+
+
+def test_middleware_overriding_handle_request(app, test_client):
+    class Header(Middleware):
+        def __init__(self, app):
+            self.app = app
+
+        def process_response(self, req, resp):
+            resp.headers["X-Header"] = "1"
+
+    class Wrapping(Middleware):
+        def handle_request(self, request):
+            response = self.app.handle_request(request)
+            response.text += " wrapped"
+            return response
+
+    app.add_middleware(Header)
+    app.add_middleware(Wrapping)
+
+    @app.route("/home")
+    def home(req, resp):
+        resp.text = "from handler"
+
+    response = test_client.get("http://testserver/home")
+
+    assert response.text == "from handler wrapped"
+    assert response.headers["X-Header"] == "1"
+
+
+def test_metrics_endpoint_and_server_timing(app, test_client):
+    app.enable_metrics(server_timing=True)
+
+    @app.route("/product/{id:d}")
+    def product(req, resp, id):
+        resp.json = {"id": id}
+
+    response = test_client.get("http://testserver/product/1")
+    test_client.get("http://testserver/product/2")
+    test_client.get("http://testserver/missing")
+
+    assert "routing;dur=" in response.headers["Server-Timing"]
+    assert "handler;dur=" in response.headers["Server-Timing"]
+
+    metrics = test_client.get("http://testserver/metrics")
+
+    assert metrics.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+    assert 'pylord_requests_total{route="/product/{id:d}",status="2xx"} 2' in metrics.text
+    assert 'pylord_requests_total{route="__unmatched__",status="4xx"} 1' in metrics.text
+    assert 'pylord_request_duration_seconds_count{route="/product/{id:d}"} 2' in metrics.text
+    assert 'pylord_response_size_bytes_sum{route="/product/{id:d}"} 16' in metrics.text
+
+
+def test_profiling_requests_with_header(app, test_client):
+    profiler = app.enable_profiling(path="/_profile")
+
+    @app.route("/work")
+    def work(req, resp):
+        resp.text = str(sum(range(1000)))
+
+    test_client.get("http://testserver/work")
+    test_client.get("http://testserver/work", headers={"X-Profile": "1"})
+
+    assert profiler.routes() == {"/work": 1}
+    assert test_client.get("http://testserver/_profile").json() == {"/work": 1}
+
+    collapsed = test_client.get("http://testserver/_profile", params={"route": "/work"}).text
+    assert "test_app.py" in collapsed and ":work" in collapsed
+
+
+def test_collapsed_stacks_follow_the_heaviest_call_edge():
+    from types import SimpleNamespace
+    from pylord.profiling import Profiler
+
+    main, light, heavy, helper = [("app.py", line, name) for line, name in
+                                  ((1, "main"), (2, "light"), (3, "heavy"), (4, "helper"))]
+    profiler = Profiler()
+    # heavy is expensive overall but only calls helper briefly, light spends most of its time there
+    profiler.stats["/r"] = SimpleNamespace(stats={
+        main: (1, 1, 0.0, 6.0, {}),
+        light: (1, 1, 0.0, 1.0, {main: (1, 1, 0.0, 1.0)}),
+        heavy: (1, 1, 4.9, 5.0, {main: (1, 1, 4.9, 5.0)}),
+        helper: (2, 2, 1.0, 1.0, {light: (1, 1, 0.9, 0.9), heavy: (1, 1, 0.1, 0.1)}),
+    })
+
+    assert "app.py:1:main;app.py:2:light;app.py:4:helper 1000000" in profiler.collapsed("/r").splitlines()
+
+
+def test_route_concurrency_limit_sheds_load(app, test_client):
+    @app.route("/expensive", limit=1)
+    def expensive(req, resp):
+        resp.text = "done"
+
+    @app.route("/cheap")
+    def cheap(req, resp):
+        resp.text = "ok"
+
+    limiter = app.routes["/expensive"]["limiter"]
+    limiter.acquire()
+
+    response = test_client.get("http://testserver/expensive")
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+    assert test_client.get("http://testserver/cheap").text == "ok"
+
+    limiter.release()
+    assert test_client.get("http://testserver/expensive").text == "done"
+    assert limiter.rejected["queue_full"] == 1
+
+
+def test_global_concurrency_limit_queue_timeout(app, test_client):
+    limiter = app.limit_concurrency(1, max_queue=1, queue_timeout=0.01, retry_after=5)
+    app.enable_metrics()
+
+    @app.route("/home")
+    def home(req, resp):
+        resp.text = "home"
+
+    limiter.acquire()
+    response = test_client.get("http://testserver/home")
+    limiter.release()
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "5"
+    assert test_client.get("http://testserver/home").text == "home"
+    assert 'pylord_limit_rejected_total{scope="global",reason="timeout"} 1' in test_client.get(
+        "http://testserver/metrics"
+    ).text
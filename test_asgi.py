@@ -0,0 +1,738 @@
+import asyncio
+import threading
+import pytest
+from pylord.asgi import PyLordASGI
+from pylord.asgi_middleware import Middleware
+from pylord.asgi_response import Response
+from pylord.asgi_static import StaticFiles, parse_range
+from pylord.broadcast import SLOW_CLIENT_CLOSE_CODE
+from pylord.headers import Headers
+from pylord.limits import AsyncConcurrencyLimiter, ConcurrencyLimiter
+from pylord.multipart import MultipartParser
+from pylord.threadpool import ThreadPool
+
+
+async def call(app, method="GET", path="/", headers=(), chunks=(b"",), query_string=b"", extensions=None):
+    scope = {
+        "type": "http", "method": method, "path": path, "query_string": query_string, "root_path": "",
+        "headers": [(name.lower().encode(), value.encode()) for name, value in headers],
+    }
+    if extensions is not None:
+        scope["extensions"] = extensions
+
+    inbox = [
+        {"type": "http.request", "body": chunk, "more_body": index < len(chunks) - 1}
+        for index, chunk in enumerate(chunks)
+    ]
+    messages = []
+
+    async def receive():
+        if inbox:
+            return inbox.pop(0)
+        await asyncio.sleep(3600)
+
+    async def send(message):
+        messages.append(message)
+
+    await app(scope, receive, send)
+
+    start, body = messages[0], messages[1:]
+    return start["status"], {k.decode(): v.decode() for k, v in start["headers"]}, body
+
+
+def request(app, **kwargs):
+    status, headers, body = asyncio.run(call(app, **kwargs))
+    return status, headers, b"".join(message.get("body", b"") for message in body)
+
+
+@pytest.fixture
+def asgi_app():
+    return PyLordASGI(templates_dir=None, static_dir=None)
+
+
+def test_cancelled_waiter_passes_its_slot_on():
+    async def scenario():
+        limiter = AsyncConcurrencyLimiter(1, max_queue=2)
+        assert await limiter.acquire()
+
+        waiter = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0)
+        limiter.release()
+        # the slot was handed to the waiter, which is cancelled before it resumes
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+
+        assert limiter.in_flight == 0
+        assert await asyncio.wait_for(limiter.acquire(), 1)
+
+    asyncio.run(scenario())
+
+
+def test_route_limiter_type_must_match_the_app(app, asgi_app):
+    with pytest.raises(TypeError):
+        asgi_app.add_route("/sync-limiter", lambda req, resp: None, limit=ConcurrencyLimiter(1))
+    with pytest.raises(TypeError):
+        app.add_route("/async-limiter", lambda req, resp: None, limit=AsyncConcurrencyLimiter(1))
+
+
+@pytest.fixture
+def static_dir(tmp_path):
+    directory = tmp_path / "static"
+    directory.mkdir()
+    (directory / "a.txt").write_bytes(b"0123456789")
+    (directory / "a.txt.gz").write_bytes(b"gzipped")
+    (tmp_path / "secret.txt").write_bytes(b"secret")
+    return directory
+
+
+def test_parse_range():
+    assert parse_range("bytes=0-4", 10) == (0, 4)
+    assert parse_range("bytes=5-", 10) == (5, 9)
+    assert parse_range("bytes=-3", 10) == (7, 9)
+    assert parse_range("bytes=-30", 10) == (0, 9)
+    assert parse_range("bytes=8-20", 10) == (8, 9)
+    assert parse_range("bytes=10-", 10) is False
+    assert parse_range("bytes=5-2", 10) is False
+    assert parse_range("bytes=-0", 10) is False
+    assert parse_range("bytes=0-1,3-4", 10) is None
+    assert parse_range("items=0-4", 10) is None
+    assert parse_range("bytes=a-b", 10) is None
+
+
+def test_static_range_and_if_range(static_dir):
+    static = StaticFiles(str(static_dir))
+    status, headers, _ = request(static, path="/static/a.txt")
+    etag = headers["etag"]
+
+    status, headers, body = request(static, path="/static/a.txt", headers=[("Range", "bytes=2-4")])
+    assert (status, body, headers["content-range"]) == (206, b"234", "bytes 2-4/10")
+
+    status, _, body = request(static, path="/static/a.txt", headers=[("Range", "bytes=2-4"), ("If-Range", etag)])
+    assert (status, body) == (206, b"234")
+
+    status, _, body = request(static, path="/static/a.txt", headers=[("Range", "bytes=2-4"), ("If-Range", '"old"')])
+    assert (status, body) == (200, b"0123456789")
+
+    status, headers, body = request(static, path="/static/a.txt", headers=[("Range", "bytes=20-")])
+    assert (status, body, headers["content-range"]) == (416, b"", "bytes */10")
+
+
+def test_static_path_traversal_is_not_served(static_dir):
+    static = StaticFiles(str(static_dir))
+    assert request(static, path="/static/../secret.txt")[0] == 404
+    assert request(static, path="/static/../static/a.txt")[0] == 200
+    assert request(static, path="/statica.txt")[0] == 404
+
+
+def test_static_encoded_variants_have_their_own_etag(static_dir):
+    static = StaticFiles(str(static_dir), indexed=True)
+    _, identity, _ = request(static, path="/static/a.txt")
+    status, gzipped, body = request(static, path="/static/a.txt", headers=[("Accept-Encoding", "gzip")])
+    assert (status, body, gzipped["content-encoding"]) == (200, b"gzipped", "gzip")
+    assert gzipped["etag"] != identity["etag"]
+
+    status, headers, _ = request(
+        static, path="/static/a.txt", headers=[("Accept-Encoding", "gzip"), ("If-None-Match", gzipped["etag"])]
+    )
+    assert (status, headers["vary"], headers["etag"]) == (304, "Accept-Encoding", gzipped["etag"])
+
+    # a validator cached for the gzip body does not match the identity bytes a range is served from
+    status, _, body = request(
+        static, path="/static/a.txt",
+        headers=[("Accept-Encoding", "gzip"), ("Range", "bytes=0-1"), ("If-Range", gzipped["etag"])]
+    )
+    assert (status, body) == (200, b"gzipped")
+
+
+def test_static_uses_server_send_extensions(static_dir):
+    static = StaticFiles(str(static_dir))
+    path = str(static_dir / "a.txt")
+
+    _, _, messages = asyncio.run(call(static, path="/static/a.txt", extensions={"http.response.pathsend": {}}))
+    assert messages == [{"type": "http.response.pathsend", "path": path}]
+
+    _, _, messages = asyncio.run(call(
+        static, path="/static/a.txt", headers=[("Range", "bytes=2-4")],
+        extensions={"http.response.pathsend": {}, "http.response.zerocopysend": {}}
+    ))
+    assert [(m["type"], m["offset"], m["count"]) for m in messages] == [("http.response.zerocopysend", 2, 3)]
+
+
+BOUNDARY = "XyZ"
+
+MULTIPART_BODY = (
+    b"--XyZ\r\n"
+    b'Content-Disposition: form-data; name="note"\r\n\r\n'
+    b"line\r\n--XyA not a delimiter\r\n"
+    b"--XyZ\r\n"
+    b'Content-Disposition: form-data; name="upload"; filename="a.txt"\r\n'
+    b"Content-Type: text/plain\r\n\r\n"
+    b"file body\r\n--Xy\r\n"
+    b"--XyZ--\r\n"
+)
+
+
+def test_multipart_parser_handles_one_byte_chunks_and_near_delimiters():
+    parser = MultipartParser(BOUNDARY.encode())
+    events = []
+    for index in range(len(MULTIPART_BODY)):
+        events.extend(parser.feed(MULTIPART_BODY[index:index + 1]))
+    parser.close()
+
+    parts, current = [], None
+    for event, value in events:
+        if event == "part":
+            current = [dict(value), b""]
+        elif event == "data":
+            current[1] += value
+        else:
+            parts.append(current)
+
+    assert [body for _, body in parts] == [b"line\r\n--XyA not a delimiter", b"file body\r\n--Xy"]
+    assert parts[1][0]["content-type"] == "text/plain"
+
+
+def multipart_app(uploads, **kwargs):
+    app = PyLordASGI(templates_dir=None, static_dir=None, **kwargs)
+
+    @app.route("/upload", methods=["POST"])
+    async def upload(req, resp):
+        form = await req.multipart(spool_size=4)
+        uploads.append(form["upload"])
+        resp.text = f"{form['note']}|{(await form['upload'].read()).decode()}"
+
+    return app
+
+
+def post_multipart(app, chunks, content_length=True):
+    headers = [("Content-Type", f"multipart/form-data; boundary={BOUNDARY}")]
+    if content_length:
+        headers.append(("Content-Length", str(sum(len(chunk) for chunk in chunks))))
+    return request(app, method="POST", path="/upload", headers=headers, chunks=chunks)
+
+
+def test_multipart_request_spools_files_and_closes_them():
+    uploads = []
+    app = multipart_app(uploads)
+    chunks = [MULTIPART_BODY[index:index + 1] for index in range(len(MULTIPART_BODY))]
+
+    status, _, body = post_multipart(app, chunks)
+    assert (status, body) == (200, b"line\r\n--XyA not a delimiter|file body\r\n--Xy")
+    assert uploads[0].file.closed
+
+
+def test_multipart_truncated_body_is_rejected():
+    status, _, _ = post_multipart(multipart_app([]), [MULTIPART_BODY[:-12]])
+    assert status == 400
+
+
+def test_multipart_body_size_limit():
+    app = multipart_app([], max_body_size=32)
+    assert post_multipart(app, [MULTIPART_BODY])[0] == 413
+
+    # without a Content-Length the limit is enforced while the body streams in
+    chunks = [MULTIPART_BODY[index:index + 16] for index in range(0, len(MULTIPART_BODY), 16)]
+    assert post_multipart(app, chunks, content_length=False)[0] == 413
+
+
+class WebSocketClient:
+    def __init__(self, app, path, send_delay=0):
+        self.app = app
+        self.path = path
+        self.send_delay = send_delay
+        self.inbox = asyncio.Queue()
+        self.inbox.put_nowait({"type": "websocket.connect"})
+        self.messages = []
+
+    async def receive(self):
+        return await self.inbox.get()
+
+    async def send(self, message):
+        self.messages.append(message)
+        if self.send_delay and message.get("text", "").isdigit():
+            await asyncio.sleep(self.send_delay)
+
+    def start(self):
+        scope = {"type": "websocket", "path": self.path, "headers": [], "query_string": b"", "root_path": ""}
+        return asyncio.ensure_future(self.app(scope, self.receive, self.send))
+
+    def disconnect(self):
+        self.inbox.put_nowait({"type": "websocket.disconnect", "code": 1000})
+
+    def texts(self):
+        return [message["text"] for message in self.messages if message["type"] == "websocket.send"]
+
+
+@pytest.fixture
+def room_app(asgi_app):
+    @asgi_app.websocket_route("/rooms/{room}")
+    async def room(ws, room):
+        await ws.accept()
+        await ws.send_text(f"joined {room}")
+        overflow = "coalesce" if room == "coalesce" else "drop"
+        await asgi_app.broadcast.forward(ws, room, max_queue=2, overflow=overflow)
+
+    return asgi_app
+
+
+def test_websocket_route_params_and_fan_out(room_app):
+    async def scenario():
+        clients = [WebSocketClient(room_app, "/rooms/lobby") for _ in range(3)]
+        tasks = [client.start() for client in clients]
+        await asyncio.sleep(0.01)
+        assert room_app.broadcast.subscriber_count("lobby") == 3
+
+        room_app.broadcast.publish("lobby", {"n": 1})
+        await asyncio.sleep(0.01)
+        for client in clients:
+            client.disconnect()
+        await asyncio.wait_for(asyncio.gather(*tasks), 1)
+
+        assert all(client.texts() == ["joined lobby", '{"n":1}'] for client in clients)
+        assert room_app.broadcast.subscriber_count() == 0
+
+    asyncio.run(scenario())
+
+
+def test_websocket_unknown_path_is_closed(room_app):
+    async def scenario():
+        client = WebSocketClient(room_app, "/nowhere")
+        await asyncio.wait_for(client.start(), 1)
+        assert client.messages == [{"type": "websocket.close", "code": 1000, "reason": ""}]
+
+    asyncio.run(scenario())
+
+
+def test_broadcast_overflow_policies(room_app):
+    async def scenario():
+        slow = WebSocketClient(room_app, "/rooms/drop", send_delay=0.05)
+        coalesced = WebSocketClient(room_app, "/rooms/coalesce", send_delay=0.05)
+        slow_task, coalesced_task = slow.start(), coalesced.start()
+        await asyncio.sleep(0.01)
+
+        for n in range(6):
+            room_app.broadcast.publish("drop", str(n))
+            room_app.broadcast.publish("coalesce", str(n))
+            await asyncio.sleep(0)
+
+        await asyncio.wait_for(slow_task, 1)
+        assert slow.messages[-1]["type"] == "websocket.close"
+        assert slow.messages[-1]["code"] == SLOW_CLIENT_CLOSE_CODE == 1013
+
+        await asyncio.sleep(0.2)
+        coalesced.disconnect()
+        await asyncio.wait_for(coalesced_task, 1)
+        received = coalesced.texts()[1:]
+        assert received[-1] == "5"
+        assert len(received) < 6
+
+    asyncio.run(scenario())
+
+
+def test_broadcast_publish_from_worker_thread(room_app):
+    async def scenario():
+        client = WebSocketClient(room_app, "/rooms/lobby")
+        task = client.start()
+        await asyncio.sleep(0.01)
+
+        await asyncio.to_thread(room_app.broadcast.publish, "lobby", [1, 2])
+        await asyncio.sleep(0.01)
+        client.disconnect()
+        await asyncio.wait_for(task, 1)
+        assert client.texts()[-1] == "[1,2]"
+
+    asyncio.run(scenario())
+
+
+def test_sync_handlers_run_on_the_thread_pool(asgi_app):
+    threads = {}
+
+    @asgi_app.route("/sync")
+    def sync(req, resp):
+        threads["sync"] = threading.get_ident()
+        resp.text = "sync"
+
+    @asgi_app.route("/inline", inline=True)
+    def inline(req, resp):
+        threads["inline"] = threading.get_ident()
+        raise ValueError("boom")
+
+    def on_error(req, resp, exc):
+        threads["exception_handler"] = threading.get_ident()
+        resp.status_code = 500
+        resp.text = str(exc)
+
+    asgi_app.add_exception_handler(on_error)
+    asgi_app.enable_metrics()
+
+    assert request(asgi_app, path="/sync")[2] == b"sync"
+    assert request(asgi_app, path="/inline")[2] == b"boom"
+
+    loop_thread = threading.get_ident()
+    assert threads["sync"] != loop_thread
+    assert threads["inline"] == loop_thread
+    assert threads["exception_handler"] != loop_thread
+
+    metrics = request(asgi_app, path="/metrics")[2].decode()
+    assert "pylord_threadpool_calls_total 2" in metrics
+    assert "pylord_threadpool_queued 0" in metrics
+
+
+def test_thread_pool_call_cancelled_while_queued():
+    pool = ThreadPool(max_workers=1)
+    release = threading.Event()
+    ran = []
+
+    async def scenario():
+        busy = asyncio.ensure_future(pool.run(release.wait, 5))
+        queued = asyncio.ensure_future(pool.run(ran.append, "queued"))
+        try:
+            await asyncio.sleep(0.01)
+            assert (pool.active, pool.queued) == (1, 1)
+
+            queued.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await queued
+            assert pool.queued == 0
+        finally:
+            release.set()
+            await busy
+
+    asyncio.run(scenario())
+    pool.shutdown()
+    assert ran == []
+    assert (pool.active, pool.queued, pool.completed) == (0, 0, 1)
+
+
+class Lifespan:
+    def __init__(self, app):
+        self.inbox = asyncio.Queue()
+        self.sent = []
+        self.task = asyncio.ensure_future(app({"type": "lifespan", "asgi": {"version": "3.0"}}, self.inbox.get, self.send))
+
+    async def send(self, message):
+        self.sent.append(message)
+
+    async def event(self, name):
+        self.inbox.put_nowait({"type": f"lifespan.{name}"})
+        await asyncio.sleep(0.01)
+        return self.sent[-1]["type"]
+
+
+def test_lifespan_runs_hooks_in_order(asgi_app):
+    calls = []
+
+    @asgi_app.on_startup
+    def open_pool():
+        calls.append("sync startup")
+        asgi_app.state.pool = "pool"
+
+    @asgi_app.on_startup
+    async def warm_up():
+        calls.append("async startup")
+
+    @asgi_app.on_shutdown
+    async def close_pool():
+        calls.append("async shutdown")
+
+    @asgi_app.on_shutdown
+    def flush():
+        calls.append("sync shutdown")
+
+    @asgi_app.route("/pool")
+    async def pool(req, resp):
+        resp.text = req.app.state.pool
+
+    async def scenario():
+        lifespan = Lifespan(asgi_app)
+        assert await lifespan.event("startup") == "lifespan.startup.complete"
+        assert calls == ["sync startup", "async startup"]
+
+        assert (await call(asgi_app, path="/pool"))[2][0]["body"] == b"pool"
+
+        assert await lifespan.event("shutdown") == "lifespan.shutdown.complete"
+        assert calls[2:] == ["async shutdown", "sync shutdown"]
+        await asyncio.wait_for(lifespan.task, 1)
+
+    asyncio.run(scenario())
+
+
+def test_lifespan_startup_failure_carries_the_traceback(asgi_app):
+    @asgi_app.on_startup
+    async def connect():
+        raise ConnectionError("database is down")
+
+    async def scenario():
+        lifespan = Lifespan(asgi_app)
+        assert await lifespan.event("startup") == "lifespan.startup.failed"
+        await asyncio.wait_for(lifespan.task, 1)
+
+        message = lifespan.sent[-1]["message"]
+        assert "Traceback" in message
+        assert "ConnectionError: database is down" in message
+
+    asyncio.run(scenario())
+
+
+@pytest.fixture
+def template_app(tmp_path):
+    (tmp_path / "report.html").write_text("<ul>{% for row in rows %}<li>{{ row }}</li>{% endfor %}</ul>")
+    return PyLordASGI(templates_dir=str(tmp_path), static_dir=None)
+
+
+def test_template_async_renders(template_app):
+    @template_app.route("/report")
+    async def report(req, resp):
+        resp.html = await template_app.template_async("report.html", context={"rows": ["a", "b"]})
+
+    status, _, body = request(template_app, path="/report")
+    assert (status, body) == (200, b"<ul><li>a</li><li>b</li></ul>")
+
+
+def test_template_stream_sends_several_chunks(template_app):
+    rows = [f"row {n}" for n in range(200)]
+
+    @template_app.route("/big-report")
+    async def big_report(req, resp):
+        resp.content_type = "text/html"
+        resp.stream = template_app.template_stream("report.html", context={"rows": rows}, chunk_size=512)
+
+    status, _, messages = asyncio.run(call(template_app, path="/big-report"))
+    chunks = [message["body"] for message in messages if message.get("body")]
+    assert status == 200
+    assert len(chunks) > 1
+    assert b"".join(chunks) == ("<ul>" + "".join(f"<li>{row}</li>" for row in rows) + "</ul>").encode()
+
+
+def test_route_etag_is_not_sent_with_errors(asgi_app):
+    @asgi_app.route("/item/{id:d}", etag=lambda req, id: "v1")
+    async def item(req, resp, id):
+        resp.status_code = 404 if id == 1 else 200
+        resp.text = "item"
+
+    status, headers, _ = request(asgi_app, path="/item/1")
+    assert (status, "etag" in headers) == (404, False)
+    assert request(asgi_app, path="/item/2")[1]["etag"] == '"v1"'
+
+
+def crunch():
+    return sum(i * i for i in range(20000))
+
+
+def background_work():
+    return sum(i * i for i in range(20000))
+
+
+def test_profiling_sync_handlers_on_the_thread_pool(asgi_app):
+    asgi_app.enable_profiling(path="/_profile")
+
+    @asgi_app.route("/sync-work")
+    def sync_work(req, resp):
+        resp.text = str(crunch())
+
+    request(asgi_app, path="/sync-work", headers=[("X-Profile", "1")])
+
+    collapsed = request(asgi_app, path="/_profile", query_string=b"route=/sync-work")[2].decode()
+    assert ":sync_work;" in collapsed
+    assert ":crunch" in collapsed
+
+
+def test_profiling_async_handlers_excludes_other_tasks(asgi_app):
+    asgi_app.enable_profiling(path="/_profile")
+
+    @asgi_app.route("/async-work")
+    async def async_work(req, resp):
+        await asyncio.sleep(0.01)
+        resp.text = str(crunch())
+
+    @asgi_app.route("/background")
+    async def background(req, resp):
+        for _ in range(3):
+            background_work()
+            await asyncio.sleep(0.002)
+
+    async def scenario():
+        await asyncio.gather(
+            call(asgi_app, path="/async-work", headers=[("X-Profile", "1")]),
+            call(asgi_app, path="/background"),
+        )
+
+    asyncio.run(scenario())
+
+    assert asgi_app.profiler.routes() == {"/async-work": 1}
+    collapsed = request(asgi_app, path="/_profile", query_string=b"route=/async-work")[2].decode()
+    assert ":crunch" in collapsed
+    assert "background_work" not in collapsed
+
+
+def test_route_etag_hooks_are_awaited_or_offloaded(asgi_app):
+    threads = []
+
+    async def async_version(req, id):
+        return f"async-{id}"
+
+    def sync_version(req, id):
+        threads.append(threading.get_ident())
+        return f"sync-{id}"
+
+    @asgi_app.route("/async-etag/{id:d}", etag=async_version)
+    async def async_etag(req, resp, id):
+        resp.text = "item"
+
+    @asgi_app.route("/sync-etag/{id:d}", etag=sync_version)
+    async def sync_etag(req, resp, id):
+        resp.text = "item"
+
+    assert request(asgi_app, path="/async-etag/1")[1]["etag"] == '"async-1"'
+    assert request(asgi_app, path="/async-etag/1", headers=[("If-None-Match", '"async-1"')])[0] == 304
+
+    assert request(asgi_app, path="/sync-etag/2")[1]["etag"] == '"sync-2"'
+    assert threads and threads[0] != threading.get_ident()
+
+
+def test_asgi_middleware_order_and_short_circuit(asgi_app):
+    calls = []
+
+    class Outer(Middleware):
+        async def process_request(self, req):
+            calls.append("outer request")
+
+        def process_response(self, req, resp):
+            calls.append("outer response")
+
+    class Auth(Middleware):
+        async def process_request(self, req):
+            calls.append("auth request")
+            if "authorization" not in req.headers:
+                response = Response()
+                response.status_code = 401
+                response.text = "Unauthorized"
+                return response
+
+    class Inner(Middleware):
+        async def process_response(self, req, resp):
+            calls.append("inner response")
+
+    asgi_app.add_middleware(Inner)
+    asgi_app.add_middleware(Auth)
+    asgi_app.add_middleware(Outer)
+
+    @asgi_app.route("/home")
+    async def home(req, resp):
+        calls.append("handler")
+        resp.text = "from handler"
+
+    assert request(asgi_app, path="/home")[0] == 401
+    assert calls == ["outer request", "auth request", "outer response"]
+
+    calls.clear()
+    assert request(asgi_app, path="/home", headers=[("Authorization", "Bearer token")])[2] == b"from handler"
+    assert calls == ["outer request", "auth request", "handler", "inner response", "outer response"]
+
+
+def test_asgi_middleware_overriding_handle_request(asgi_app):
+    class Header(Middleware):
+        def __init__(self, app):
+            self.app = app
+
+        async def process_response(self, req, resp):
+            resp.headers["X-Header"] = "1"
+
+    class Wrapping(Middleware):
+        async def handle_request(self, request):
+            response = await self.app.handle_asgi_request(request)
+            response.text += " wrapped"
+            return response
+
+    asgi_app.add_middleware(Header)
+    asgi_app.add_middleware(Wrapping)
+
+    @asgi_app.route("/home")
+    async def home(req, resp):
+        resp.text = "from handler"
+
+    status, headers, body = request(asgi_app, path="/home")
+    assert (status, body, headers["x-header"]) == (200, b"from handler wrapped", "1")
+
+
+def test_response_headers_are_case_insensitive():
+    headers = Headers({"Content-Encoding": "gzip"})
+    headers["content-encoding"] = "br"
+    headers.setdefault("ETAG", '"v1"')
+
+    assert "CONTENT-ENCODING" in headers
+    assert headers.get("etag") == '"v1"'
+    assert list(headers.items()) == [("Content-Encoding", "br"), ("ETAG", '"v1"')]
+
+    app = PyLordASGI(templates_dir=None, static_dir=None, auto_etag=True)
+
+    @app.route("/tagged")
+    async def tagged(req, resp):
+        resp.headers["etag"] = '"mine"'
+        resp.text = "tagged"
+
+    async def scenario():
+        _, headers, _ = await call(app, path="/tagged")
+        return headers
+
+    assert asyncio.run(scenario()) == {
+        "etag": '"mine"', "content-length": "6", "content-type": "text/plain; charset=utf-8"
+    }
+
+
+def test_asgi_compression(asgi_app):
+    import gzip
+
+    asgi_app.add_compression(minimum_size=100)
+
+    @asgi_app.route("/big")
+    async def big(req, resp):
+        resp.headers["Vary"] = "Accept-Language"
+        resp.text = "x" * 1000
+
+    @asgi_app.route("/small")
+    async def small(req, resp):
+        resp.text = "x"
+
+    status, headers, body = request(asgi_app, path="/big", headers=[("Accept-Encoding", "gzip")])
+    assert (headers["content-encoding"], headers["vary"]) == ("gzip", "Accept-Language, Accept-Encoding")
+    assert gzip.decompress(body) == b"x" * 1000
+
+    status, headers, body = request(asgi_app, path="/big", headers=[("Accept-Encoding", "identity")])
+    assert "content-encoding" not in headers
+    assert headers["vary"] == "Accept-Language, Accept-Encoding"
+    assert body == b"x" * 1000
+
+    _, headers, _ = request(asgi_app, path="/small", headers=[("Accept-Encoding", "gzip")])
+    assert "content-encoding" not in headers and "vary" not in headers
+
+
+def test_asgi_route_response_cache(asgi_app):
+    calls = []
+
+    @asgi_app.route("/product/{id:d}", cache=60)
+    async def product(req, resp, id):
+        calls.append(req.method)
+        resp.json = {"id": id, "calls": len(calls)}
+
+    first = request(asgi_app, path="/product/1")
+    second = request(asgi_app, path="/product/1")
+    request(asgi_app, path="/product/1", query_string=b"page=2")
+
+    assert first == second
+    assert second[2] == b'{"id":1,"calls":1}'
+    assert calls == ["GET", "GET"]
+
+    # HEAD is cached under its own key and never replays a GET body
+    status, headers, body = request(asgi_app, method="HEAD", path="/product/1")
+    assert (status, body, headers["content-length"]) == (200, b"", "18")
+    request(asgi_app, method="HEAD", path="/product/1")
+    assert calls == ["GET", "GET", "HEAD"]
+
+    cache = asgi_app.routes["/product/{id:d}"]["cache"]
+    assert (cache.stats["hits"], cache.stats["misses"]) == (2, 3)
+
+    asgi_app.invalidate_cache("/product/1")
+    assert request(asgi_app, path="/product/1")[2] == b'{"id":1,"calls":4}'
+    assert calls == ["GET", "GET", "HEAD", "GET"]
@@ -1,7 +1,9 @@
+import asyncio
 import os
 import sqlite3
+import threading
 import pytest
-from pylord.orm import Database, Table, Column, ForeignKey
+from pylord.orm import Database, Table, Column, ForeignKey, atomic
 
 
 @pytest.fixture()
@@ -216,3 +218,239 @@ def test_upgraded_get_function(db, Author):
 
     assert authorjonxon.name == 'kamoljon'
     assert authorjonxon.age == 61
+
+
+def test_table_sql_is_built_once(Author, Book):
+    assert [name for name, _ in Book._columns] == ["author", "published", "title"]
+    assert Book._fields == ["author_id", "published", "title"]
+
+    assert Author._select_by_id_sql == "SELECT id, age, name FROM author WHERE id = ?;"
+    assert Author._update_sql == "UPDATE author SET age = ?, name = ? WHERE id = ?;"
+    assert Author._delete_sql == "DELETE FROM author WHERE id = ?;"
+
+
+def test_plain_queries_use_prebuilt_statements(db, Author, Book):
+    db.create(Author)
+    db.create(Book)
+    db.save(Author(name="kimdur", age=44))
+    db.save(Book(title="utkan kunlar", published=True, author_id=1))
+
+    queries = []
+    db.conn.set_trace_callback(queries.append)
+
+    book = db.get(Book, 1)
+    assert book.author.name == "kimdur"
+    assert [author.name for author in db.all(Author)] == ["kimdur"]
+    assert db.get_by_field(Author, "name", "kim").age == 44
+
+    assert queries[:3] == [
+        Book._select_by_id_sql.replace("?", "1"),
+        Author._select_by_id_sql.replace("?", "1"),
+        Author._select_all_sql,
+    ]
+    assert queries[3] == "SELECT id, age, name FROM author WHERE name LIKE '%kim%' LIMIT 1"
+
+
+def test_select_and_prefetch_related(db, Author):
+    class Publisher(Table):
+        name = Column(str)
+
+    class Novel(Table):
+        title = Column(str)
+        author = ForeignKey(Author)
+        publisher = ForeignKey(Publisher)
+
+    for table in (Author, Publisher, Novel):
+        db.create(table)
+
+    kimdur, sandur = Author(name="kimdur", age=44), Author(name="sandur", age=78)
+    penguin = Publisher(name="penguin")
+    for instance in (kimdur, sandur, penguin):
+        db.save(instance)
+    for title, author in (("a", kimdur), ("b", sandur), ("c", kimdur)):
+        db.save(Novel(title=title, author=author, publisher=penguin))
+
+    queries = []
+    db.conn.set_trace_callback(queries.append)
+
+    novels = db.all(Novel, select_related=["author", "publisher"])
+    assert len(queries) == 1
+    assert [(novel.title, novel.author.name, novel.publisher.name) for novel in novels] == [
+        ("a", "kimdur", "penguin"), ("b", "sandur", "penguin"), ("c", "kimdur", "penguin")
+    ]
+
+    queries.clear()
+    novels = db.all(Novel, select_related=["publisher"], prefetch_related=["author"])
+    assert len(queries) == 2
+    assert novels[0].author is novels[2].author
+    assert novels[1].author.age == 78
+
+    queries.clear()
+    novel = db.get(Novel, 2, select_related=["author"], prefetch_related=["publisher"])
+    assert len(queries) == 2
+    assert (novel.author.name, novel.publisher.name) == ("sandur", "penguin")
+
+
+def test_foreign_keys_load_lazily(db, Author, Book):
+    db.create(Author)
+    db.create(Book)
+
+    kimdur = Author(name="kimdur", age=44)
+    db.save(kimdur)
+    db.save(Book(title="utkan kunlar", published=True, author=kimdur))
+    db.save(Book(title="no author", published=False, author_id=None))
+
+    queries = []
+    db.conn.set_trace_callback(queries.append)
+
+    book = db.get(Book, 1)
+    assert book.author_id == 1
+    assert len(queries) == 1
+
+    assert book.author.name == "kimdur"
+    assert book.author is book.author
+    assert len(queries) == 2
+
+    assert db.get(Book, 2).author is None
+
+
+def test_foreign_key_id_assignment_wins_over_loaded_row(db, Author, Book):
+    db.create(Author)
+    db.create(Book)
+
+    db.save(Author(name="kimdur", age=44))
+    db.save(Author(name="sandur", age=30))
+    db.save(Book(title="utkan kunlar", published=True, author_id=1))
+
+    book = db.get(Book, 1)
+    assert book.author.name == "kimdur"
+
+    book.author_id = 2
+    assert book.author.name == "sandur"
+    db.update(book)
+    assert db.get(Book, 1).author_id == 2
+
+
+def test_serializing_does_not_load_foreign_keys(db, Author, Book):
+    from pylord.serializers import table_to_dict
+
+    db.create(Author)
+    db.create(Book)
+
+    kimdur = Author(name="kimdur", age=44)
+    db.save(kimdur)
+    for title in ("one", "two", "three"):
+        db.save(Book(title=title, published=True, author=kimdur))
+
+    queries = []
+    db.conn.set_trace_callback(queries.append)
+
+    data = [table_to_dict(book) for book in db.all(Book)]
+    assert len(queries) == 1
+    assert data[0] == {"id": 1, "title": "one", "published": True, "author_id": 1}
+
+    book = db.get(Book, 1)
+    book.author
+    assert table_to_dict(book)["author"] is book.author
+
+
+def test_bulk_operations(db, Author, Book):
+    db.create(Author)
+    db.create(Book)
+
+    db.save(Author(name="first", age=1))
+    authors = db.bulk_save([Author(name=f"author {i}", age=i) for i in range(10)], batch_size=3)
+    assert [author.id for author in authors] == list(range(2, 12))
+    assert db.get(Author, 11).name == "author 9"
+
+    db.bulk_save([Book(title=f"book {i}", published=False, author=authors[i % 2]) for i in range(4)])
+
+    for author in authors:
+        author.age += 100
+        author.name = "unchanged"
+    assert db.bulk_update(authors, fields=["age"], batch_size=4) == 10
+    assert db.get(Author, 2).age == 100
+    assert db.get(Author, 2).name == "author 0"
+
+    assert db.delete_where(Book, author=authors[0]) == 2
+    assert db.delete_many(Author, [author.id for author in authors[5:]]) == 5
+    assert len(db.all(Author)) == 6
+    assert [book.author_id for book in db.all(Book)] == [3, 3]
+
+
+def test_other_threads_wait_for_an_open_transaction(db, Author):
+    db.create(Author)
+    counts = []
+
+    def count_authors():
+        counts.append(len(db.all(Author)))
+
+    with db.transaction():
+        db.save(Author(name="kimdur", age=44))
+        reader = threading.Thread(target=count_authors)
+        reader.start()
+        reader.join(0.1)
+        # the other thread cannot read the uncommitted row through the shared connection
+        assert reader.is_alive()
+        assert counts == []
+
+    reader.join(1)
+    assert counts == [1]
+
+
+def test_coroutines_cannot_join_each_others_transaction(db, Author):
+    db.create(Author)
+
+    async def write(name, fail):
+        with db.transaction():
+            db.save(Author(name=name, age=1))
+            await asyncio.sleep(0.01)
+            if fail:
+                raise ValueError("undo this transaction only")
+
+    async def scenario():
+        return await asyncio.gather(write("kept", False), write("other", True), return_exceptions=True)
+
+    first, second = asyncio.run(scenario())
+    assert first is None
+    assert isinstance(second, RuntimeError)
+    assert [author.name for author in db.all(Author)] == ["kept"]
+    assert not db.in_transaction
+
+
+def test_transactions_defer_commit_and_nest(db, Author):
+    db.create(Author)
+    reader = sqlite3.connect("./test.db")
+
+    with db.transaction():
+        db.save(Author(name="kimdur", age=44))
+        assert reader.execute("SELECT COUNT(*) FROM author").fetchone()[0] == 0
+
+        with pytest.raises(ValueError):
+            with db.transaction():
+                db.save(Author(name="sandur", age=78))
+                raise ValueError("undo the inner block only")
+
+        assert db.in_transaction
+
+    assert not db.in_transaction
+    assert [author.name for author in db.all(Author)] == ["kimdur"]
+    assert reader.execute("SELECT COUNT(*) FROM author").fetchone()[0] == 1
+    reader.close()
+
+    @atomic(lambda: db)
+    def register(name):
+        db.save(Author(name=name, age=1))
+        raise RuntimeError("fails after the insert")
+
+    with pytest.raises(RuntimeError):
+        register("kamol")
+    assert len(db.all(Author)) == 1
+
+
+def test_database_isolation_level():
+    db = Database(":memory:", isolation="immediate")
+    assert db.isolation == "IMMEDIATE"
+
+    with pytest.raises(ValueError):
+        Database(":memory:", isolation="SERIALIZABLE")